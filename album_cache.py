@@ -0,0 +1,126 @@
+import threading
+from types import MappingProxyType
+from traceback import format_exc
+import library
+import media
+import player_state
+import metrics
+
+# Resolves every library:album:<id> URI in the tag library to its track list
+# ahead of time, so a tap can queue track URIs directly instead of making
+# owntone resolve the album first. The album metadata comes along for free
+# and is available for logs and UIs without extra HTTP calls.
+#
+# The cache is rebuilt at startup, when library.toml is reloaded and when
+# owntone reports a database change.
+
+ALBUM_PREFIX = "library:album:"
+
+## Above this many tracks a tap keeps sending the album URI (URL length)
+MAX_TRACKS = 200
+
+## album URI -> metadata incl. resolved "track_uris"; swapped whole on refresh
+albums = MappingProxyType({})
+
+metrics.gauge("album_cache_albums", "Albums resolved to track lists").set_fn(lambda: len(albums))
+
+
+def resolve(uri: str):
+    album_id = uri[len(ALBUM_PREFIX):]
+    meta = media.album(album_id)
+    tracks = media.album_tracks(album_id)
+    return MappingProxyType({
+        "artist": meta.get("artist", ""),
+        "name": meta.get("name", ""),
+        "track_count": meta.get("track_count", len(tracks)),
+        "length_ms": meta.get("length_ms", sum(t.get("length_ms", 0) for t in tracks)),
+        "artwork_url": meta.get("artwork_url"),
+        "track_uris": ",".join(t["uri"] for t in tracks),
+        "paths": tuple(t["path"] for t in tracks if t.get("path")),
+    })
+
+
+def refresh(playlists=None):
+    global albums
+    playlists = library.playlists if playlists is None else playlists
+    resolved = {}
+    for entry in playlists.values():
+        for uri in entry["uris"].split(","):
+            uri = uri.strip()
+            if not uri.startswith(ALBUM_PREFIX) or uri in resolved:
+                continue
+            try:
+                resolved[uri] = resolve(uri)
+            except Exception as e:
+                print(f"[albums] could not resolve {uri}: {e}")
+    albums = MappingProxyType(resolved)
+    print(f"[albums] resolved {len(resolved)} albums")
+
+
+def payload(entry) -> dict:
+    """Queue args for `entry` with album URIs replaced by their cached tracks."""
+    resolved = []
+    for uri in entry["uris"].split(","):
+        album = albums.get(uri.strip())
+        if album is None or not album["track_uris"]:
+            return entry
+        resolved.append(album["track_uris"])
+    tracks = ",".join(resolved)
+    if tracks.count(",") >= MAX_TRACKS:
+        return entry
+    return {**entry, "uris": tracks}
+
+
+def describe(entry) -> str:
+    """e.g. 'A Perfect Circle - Eat the Elephant (12 tracks, 56:47)', or the URI if unknown."""
+    parts = []
+    for uri in entry["uris"].split(","):
+        album = albums.get(uri.strip())
+        if album is None:
+            parts.append(uri.strip())
+            continue
+        minutes, seconds = divmod(album["length_ms"] // 1000, 60)
+        title = f"{album['artist']} - {album['name']}".strip(" -")
+        parts.append(f"{title} ({album['track_count']} tracks, {minutes}:{seconds:02d})")
+    return ", ".join(parts)
+
+
+class Refresher:
+    """Background thread that coalesces refresh requests into one rebuild at a time."""
+
+    def __init__(self):
+        self.wanted = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        metrics.watch_thread("album_refresh", self.thread)
+
+    def request(self):
+        self.wanted.set()
+
+    def run(self):
+        while True:
+            self.wanted.wait()
+            self.wanted.clear()
+            try:
+                refresh()
+            except Exception:
+                print(format_exc())
+
+
+_refresher = None
+
+
+def request_refresh(*_):
+    if _refresher:
+        _refresher.request()
+
+
+def start():
+    """Resolve the library now (in the background) and keep it fresh."""
+    global _refresher
+    if _refresher is None:
+        _refresher = Refresher()
+        player_state.state.on_change(
+            lambda events: request_refresh() if "database" in events else None
+        )
+    request_refresh()
@@ -0,0 +1,171 @@
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+# Local stand-in for the owntone JSON API with configurable response latency.
+# It keeps just enough player state to tell when playback started/stopped and
+# what volume was last applied, and timestamps every request it serves.
+
+
+class FakeOwnTone:
+    def __init__(self, latency_ms: float = 5.0, jitter_ms: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.player = {
+            "state": "stop",
+            "repeat": "off",
+            "shuffle": False,
+            "volume": 50,
+            "item_id": 0,
+            "item_progress_ms": 0,
+        }
+        self.queue_version = 0
+        self.events = []  # (monotonic time, method, path, player state, volume)
+        self.cond = threading.Condition()
+        self.connections = set()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and drop open keep-alive connections, like owntone going away."""
+        self.server.shutdown()
+        self.server.server_close()
+        for conn in list(self.connections):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def wait_for(self, predicate, since: float, timeout: float = 10.0):
+        """Time of the first event at/after `since` matching predicate(event), or None."""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                for event in self.events:
+                    if event[0] >= since and predicate(event):
+                        return event[0]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+    def _record(self, method, path):
+        with self.cond:
+            self.events.append((time.monotonic(), method, path, self.player["state"], self.player["volume"]))
+            self.cond.notify_all()
+
+    def route(self, method, path, body):
+        url = urlsplit(path)
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        p = self.player
+        if method == "GET":
+            if url.path == "/api/player":
+                return 200, p
+            if url.path == "/api/library":
+                return 200, {"songs": 0, "albums": 0, "artists": 0, "updating": False}
+            if url.path == "/api/outputs":
+                return 200, {"outputs": [{"id": "0", "name": "Computer", "selected": True, "volume": p["volume"]}]}
+            if url.path == "/api/config":
+                return 200, {"websocket_port": 0, "version": "fake"}
+            if url.path == "/api/queue":
+                return 200, {"version": self.queue_version, "count": 0, "items": []}
+            if url.path.startswith("/api/library/albums/"):
+                album_id = url.path.split("/")[4]
+                tracks = [
+                    {"id": n, "uri": f"library:track:{album_id}{n:02d}", "length_ms": 180000, "path": ""}
+                    for n in range(1, 13)
+                ]
+                if url.path.endswith("/tracks"):
+                    return 200, {"items": tracks, "total": len(tracks), "offset": 0, "limit": -1}
+                return 200, {"id": album_id, "name": f"Album {album_id}", "artist": "Fake Artist",
+                             "track_count": len(tracks), "length_ms": 180000 * len(tracks)}
+            return 404, None
+        if url.path == "/api/queue/items/add":
+            if q.get("clear") == "true":
+                self.queue_version += 1
+                p["item_id"] += 1
+                p["item_progress_ms"] = 0
+            if "shuffle" in q:
+                p["shuffle"] = q["shuffle"] == "true"
+            if q.get("playback") == "start":
+                p["state"] = "play"
+            return 200, {"count": 1}
+        if url.path == "/api/queue/clear":
+            self.queue_version += 1
+            p["state"] = "stop"
+            return 204, None
+        if url.path in ("/api/player/play", "/api/player/pause", "/api/player/stop"):
+            p["state"] = url.path.rsplit("/", 1)[1]
+            return 204, None
+        if url.path in ("/api/player/next", "/api/player/previous", "/api/player/seek", "/api/outputs/set"):
+            return 204, None
+        if url.path == "/api/player/repeat":
+            p["repeat"] = q.get("state", p["repeat"])
+            return 204, None
+        if url.path == "/api/player/shuffle":
+            p["shuffle"] = q.get("state") == "true"
+            return 204, None
+        if url.path == "/api/player/volume":
+            p["volume"] = int(q.get("volume", p["volume"]))
+            return 204, None
+        if url.path.startswith("/api/outputs/"):
+            p["volume"] = int((body or {}).get("volume", p["volume"]))
+            return 204, None
+        return 404, None
+
+    def _handler(fake):
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                fake.connections.add(self.connection)
+
+            def finish(self):
+                fake.connections.discard(self.connection)
+                super().finish()
+
+            def _serve(self, method):
+                n = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(n) if n else b""
+                delay = fake.latency_ms + random.uniform(0, fake.jitter_ms)
+                time.sleep(delay / 1000)
+                with fake.cond:
+                    status, payload = fake.route(method, self.path, json.loads(raw) if raw else None)
+                fake._record(method, self.path)
+                data = json.dumps(payload).encode() if payload is not None else b""
+                self.send_response(status)
+                if data:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_PUT(self):
+                self._serve("PUT")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Card-to-audio latency benchmark that runs on any Linux box.
+
+The PN532 is replaced by a scripted reader and owntone by a local stub server
+(benchmarks/fake_owntone.py); everything in between is the real code path:
+NFCMonitor -> main.handle_new_card -> playback -> media -> HTTP.
+
+    python benchmarks/latency.py --taps 30 --latency-ms 20 > bench_output.txt
+
+With --trace the reader plays back a recording from nfc_trace.py instead of
+scripted taps, e.g. a flaky tag captured on the real hardware:
+
+    python benchmarks/latency.py --trace nfc.trace --speed 2
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import album_cache
+import library
+import main
+import media
+import nfc_trace
+import playback
+import prefetch
+from fake_owntone import FakeOwnTone
+from nfc_monitor import NFCMonitor
+from volume_control import VolumeDispatcher
+
+
+class ScriptedReader:
+    """Stands in for PN532_SPI; place()/remove() simulate a tag on the reader."""
+
+    def __init__(self, spi_ms: float = 3.0):
+        self.spi_ms = spi_ms
+        self.uid = None
+        self.lock = threading.Lock()
+
+    def place(self, uid: str):
+        with self.lock:
+            self.uid = bytes.fromhex(uid)
+
+    def remove(self):
+        with self.lock:
+            self.uid = None
+
+    def read_passive_target(self, card_baud=0, timeout: float = 1):
+        with self.lock:
+            uid = self.uid
+        if uid:
+            time.sleep(self.spi_ms / 1000)
+            return bytearray(uid)
+        # the real reader waits out the full timeout when no card answers
+        time.sleep(timeout)
+        return None
+
+    def listen_for_passive_target(self, card_baud=0, timeout: float = 1):
+        return True
+
+    def get_passive_target(self, timeout: float = 1):
+        return self.read_passive_target(timeout=timeout)
+
+
+def percentile(samples, pct):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def report(name, samples, expected, missing_note="timed out"):
+    ms = [s * 1000 for s in samples]
+    missing = expected - len(samples)
+    print(
+        f"{name:<18} n={len(ms):<4} "
+        f"p50={percentile(ms, 50):8.1f}ms  p95={percentile(ms, 95):8.1f}ms  p99={percentile(ms, 99):8.1f}ms"
+        + (f"  ({missing} {missing_note})" if missing else "")
+    )
+
+
+def starts_playback(event):
+    _, method, path, state, _ = event
+    return state == "play" and (
+        path.startswith("/api/queue/items/add") or path.startswith("/api/player/play")
+    )
+
+
+def stops_playback(event):
+    _, method, path, state, _ = event
+    return state in ("stop", "pause") and path.startswith(("/api/player/stop", "/api/player/pause"))
+
+
+def bench_cards(fake, reader, uids, taps, hold, gap):
+    tap_to_play = []
+    removal_to_stop = []
+    for i in range(taps):
+        uid = uids[i % len(uids)]
+        t0 = time.monotonic()
+        reader.place(uid)
+        t = fake.wait_for(starts_playback, since=t0)
+        if t is not None:
+            tap_to_play.append(t - t0)
+        time.sleep(hold)
+
+        t1 = time.monotonic()
+        reader.remove()
+        t = fake.wait_for(stops_playback, since=t1)
+        if t is not None:
+            removal_to_stop.append(t - t1)
+        time.sleep(gap)
+    return tap_to_play, removal_to_stop
+
+
+def card_appearances(events):
+    """Trace seconds at which a card shows up after a miss (or another card)."""
+    appearances = []
+    previous = None
+    for t, kind, uid in events:
+        if kind == nfc_trace.ERROR:
+            continue
+        if kind == nfc_trace.UID and uid != previous:
+            appearances.append(t)
+        previous = uid if kind == nfc_trace.UID else None
+    return appearances
+
+
+def bench_trace(fake, reader, events, speed):
+    """Time from each card appearing in the trace to playback starting; flaky re-reads may not restart it."""
+    tap_to_play = []
+    appearances = card_appearances(events)
+    start = None
+    for i, t in enumerate(appearances):
+        if start is None:
+            # the reader's clock starts with its first poll
+            while reader.start is None:
+                time.sleep(0.001)
+            start = reader.start
+        t0 = start + t / speed
+        time.sleep(max(0.0, t0 - time.monotonic()))
+        until_next = (appearances[i + 1] - t) / speed if i + 1 < len(appearances) else 2.0
+        played = fake.wait_for(starts_playback, since=t0, timeout=min(2.0, until_next))
+        if played is not None:
+            tap_to_play.append(played - t0)
+    reader.finished.wait()
+    return tap_to_play, len(appearances)
+
+
+def bench_knob(fake, spins, detents, detent_interval):
+    """Spin the knob `detents` steps per spin; time from last detent to final volume applied."""
+    dispatcher = VolumeDispatcher(media.volume)
+    samples = []
+    vol = 50
+    for i in range(spins):
+        # alternate direction so the volume never clamps and the final value is always new
+        step = 5 if i % 2 == 0 else -5
+        for _ in range(detents):
+            vol += step
+            t0 = time.monotonic()
+            dispatcher.set(vol)
+            time.sleep(detent_interval)
+        final = vol
+        t = fake.wait_for(lambda e: e[2].startswith("/api/outputs/") and e[4] == final, since=t0)
+        if t is not None:
+            samples.append(t - t0)
+        time.sleep(0.2)
+    return samples, dispatcher.stats()
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--taps", type=int, default=20)
+    parser.add_argument("--hold", type=float, default=1.5, help="seconds a card stays on the reader")
+    parser.add_argument("--gap", type=float, default=0.5, help="seconds between removal and next tap")
+    parser.add_argument("--latency-ms", type=float, default=10.0, help="owntone response latency")
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--spi-ms", type=float, default=3.0, help="simulated PN532 read time with a card")
+    parser.add_argument("--same-card", action="store_true", help="re-tap one card (exercises resume-in-place)")
+    parser.add_argument("--spins", type=int, default=10)
+    parser.add_argument("--detents", type=int, default=8, help="detents per spin (5%% each, keep under 10)")
+    parser.add_argument("--detent-ms", type=float, default=15.0)
+    parser.add_argument("--trace", help="replay an nfc_trace.py recording instead of scripted taps")
+    parser.add_argument("--speed", type=float, default=1.0, help="trace playback speed")
+    args = parser.parse_args()
+
+    fake = FakeOwnTone(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms).start()
+    media.configure(fake.base_url)
+    playback.init()
+    album_cache.refresh()
+
+    events = nfc_trace.load(args.trace) if args.trace else None
+    reader = nfc_trace.TraceReader(events, args.speed) if events else ScriptedReader(spi_ms=args.spi_ms)
+    monitor = NFCMonitor(
+        on_card_detected=main.handle_new_card,
+        on_card_removed=main.handle_card_removed,
+        mode="polling",
+        reader=reader,
+    )
+    monitor.start()
+
+    if events:
+        tap_to_play, taps = bench_trace(fake, reader, events, args.speed)
+        removal_to_stop = None
+    else:
+        taps = args.taps
+        uids = list(library.playlists)[:1] if args.same_card else list(library.playlists)
+        tap_to_play, removal_to_stop = bench_cards(fake, reader, uids, taps, args.hold, args.gap)
+    knob, stats = bench_knob(fake, args.spins, args.detents, args.detent_ms / 1000)
+
+    monitor.stop()
+    fake.stop()
+
+    print()
+    print(f"owntone latency {args.latency_ms}ms (+{args.jitter_ms}ms jitter), NFC poll rate {monitor.poll_rate():.1f}/s")
+    report("tap-to-play", tap_to_play, taps, "no playback" if events else "timed out")
+    if removal_to_stop is not None:
+        report("removal-to-stop", removal_to_stop, taps)
+    report("knob-to-volume", knob, args.spins)
+    print(f"volume commands: {stats['requested']} requested, {stats['sent']} sent, {stats['dropped']} coalesced")
+    if prefetch.stats():
+        print("prefetch: {hits} hits, {misses} misses".format(**prefetch.stats()))
+
+
+if __name__ == "__main__":
+    run()
@@ -1,44 +1,93 @@
+import json
+import os
+import tomllib
+from types import MappingProxyType
+from traceback import format_exc
 
-playlists = {
-    # Perfect Circle - Eat the Elephant
-    "21761305": {
-        "uris": "library:album:5491176371471058835",
-        "shuffle": "false"
-    },
+# Tag library: NFC UID -> owntone queue args, read from library.toml (or a
+# .json file with the same shape). `playlists` is an immutable index that is
+# swapped in whole on reload, so lookups from the NFC thread never block or
+# see a half-built library.
 
-    # Perfect Circle - Eat the Elephant
-    "B94C0D05": {
-        "uris": "library:album:5491176371471058835",
-        "shuffle": "false"
-    },
+LIBRARY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "library.toml")
 
 
+class LibraryError(ValueError):
+    pass
 
 
-    ## TTRPG Music 
+def _no_duplicate_keys(pairs):
+    out = {}
+    for key, value in pairs:
+        if key in out:
+            raise LibraryError(f"duplicate UID {key}")
+        out[key] = value
+    return out
 
-    # Combat Music
-    "B2AC41AE": {
-        "uris": "library:album:6384875762260480698",
-        "shuffle": "false"
-    },
 
-    # Marketplace Music
-    "81E17905": {
-        "uris": "library:album:6555385773523479661",
-        "shuffle": "false"
-    },
+def parse(path: str = LIBRARY_FILE) -> MappingProxyType:
+    try:
+        if path.endswith(".json"):
+            with open(path, "r") as f:
+                raw = json.load(f, object_pairs_hook=_no_duplicate_keys)
+        else:
+            with open(path, "rb") as f:
+                raw = tomllib.load(f)  # TOML itself rejects duplicate keys
+    except (tomllib.TOMLDecodeError, json.JSONDecodeError) as e:
+        raise LibraryError(f"{path}: {e}") from e
 
-    # Harbor Music
-    "B94C0D05": {
-        "uris": "library:album:6806322487804259551",
-        "shuffle": "false",
-    },
+    index = {}
+    owners = {}
+    for uid, entry in raw.items():
+        key = uid.strip().upper()
+        if key in index:
+            raise LibraryError(f"duplicate UID {key}")
+        if not isinstance(entry, dict) or not isinstance(entry.get("uris"), str) or not entry["uris"]:
+            raise LibraryError(f"{key}: entry needs a \"uris\" string")
 
-    # Forest Music
-    "43A2EB33": {
-        "uris": "library:album:948097856744077898",
-        "shuffle": "false",
-    }
+        entry = dict(entry)
+        shuffle = entry.get("shuffle", "false")
+        if isinstance(shuffle, bool):
+            shuffle = "true" if shuffle else "false"
+        if shuffle not in ("true", "false"):
+            raise LibraryError(f"{key}: shuffle must be true or false")
+        entry["shuffle"] = shuffle
 
-}
+        for uri in entry["uris"].split(","):
+            uri = uri.strip()
+            if uri in owners:
+                raise LibraryError(f"{uri} is assigned to both {owners[uri]} and {key}")
+            owners[uri] = key
+        index[key] = MappingProxyType(entry)
+    return MappingProxyType(index)
+
+
+playlists = parse()
+
+
+def load(path: str = LIBRARY_FILE):
+    """Parse `path` and atomically swap it in; raises LibraryError and keeps the old index on failure."""
+    global playlists
+    playlists = parse(path)
+    print(f"library loaded: {len(playlists)} tags")
+    return playlists
+
+
+def watch(path: str = LIBRARY_FILE, on_reload=None):
+    """Reload the library whenever `path` changes."""
+    from watch_reload import start_watch_file
+
+    def reload(_):
+        try:
+            load(path)
+        except LibraryError as e:
+            print(f"[library] reload failed ({e}); keeping old library")
+            return
+        except Exception:
+            print("[library] reload failed; keeping old library")
+            print(format_exc())
+            return
+        if on_reload:
+            on_reload(playlists)
+
+    return start_watch_file(path, reload)
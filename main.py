@@ -1,40 +1,37 @@
 import library
 import playback
-import syslog
-from volume_control import VolumeControl, cleanup
-from threading import Thread, Event
-from traceback import format_exc
-from nfc_monitor import NFCMonitor
-
-stop_event = Event()
-
-def thread(func):
-    try:
-        func()
-    except:
-        e = format_exc()
-        print(e)
-        syslog.syslog(syslog.LOG_ERR, e)
-        stop_event.set()
+import album_cache
+import metrics
+import runtime
 
 def handle_new_card(uid_str: str):
-    print(f"handling new card: {uid_str}")
-    if library.playlists[uid_str]:
-        playback.queue(uid_str)
+    entry = library.playlists.get(uid_str)
+    print(f"handling new card: {uid_str}" + (f" ({album_cache.describe(entry)})" if entry else ""))
+    if entry:
+        playback.worker().submit(playback.queue, uid_str)
 
 def handle_card_removed():
     print("card removed")
-    playback.stop()
+    playback.worker().submit(playback.stop)
 
-try:
-    playback.init()
-    monitor = NFCMonitor(
-        on_card_detected=handle_new_card,
-        on_card_removed=handle_card_removed,
-    ).start()
-    VolumeControl().start()
-    
+def on_ready():
+    album_cache.start()
+    library.watch(on_reload=album_cache.request_refresh)
+
+def main():
+    try:
+        metrics.start_server()
+    except OSError as e:
+        # e.g. port in use by a stale instance; play cards anyway
+        print(f"[WARN] metrics endpoint unavailable ({e}); running without it")
+    try:
+        runtime.run(
+            on_card_detected=handle_new_card,
+            on_card_removed=handle_card_removed,
+            on_ready=on_ready,
+        )
+    except Exception as e:
+        print(f"Error: {e}")
 
-    stop_event.wait()
-except Exception as e:
-    print(f"Error: {e}")
+if __name__ == "__main__":
+    main()
@@ -1,90 +1,397 @@
-from requests import get, put, post
+from time import monotonic, sleep
+import metrics
+import resilience
 from datetime import datetime
 from urllib.parse import urlencode, quote
 from threading import Lock
 
 # https://owntone.github.io/owntone-server/json-api/
 
+# requests is imported with the first client; it is the slowest import in
+# the player and nothing needs it until owntone is up
+requests = None
+
 ## Base URL for owntone API
 base = "http://localhost:3689"
 
 ## Default output
 output = 0
 
+## (connect, read) timeouts in seconds for every owntone call
+timeout = (1.0, 5.0)
+
+## Keep-alive connections held open to owntone. The NFC, volume and main
+## threads can each have a request in flight, so keep at least that many.
+pool_size = 4
+
+## Total seconds per call including retries, and how often calls that are
+## safe to repeat (GET/PUT, except next/previous) are retried
+deadline = resilience.DEADLINE
+retries = resilience.RETRIES
+
+IDEMPOTENT = ("GET", "PUT", "DELETE")
+
+## Shared by both clients: while owntone is down every call fails fast with
+## resilience.CircuitOpen instead of waiting for its own timeout
+breaker = resilience.CircuitBreaker("owntone")
+
+
+request_seconds = metrics.histogram("owntone_request_seconds", "Latency of owntone API calls", ("endpoint",))
+requests_total = metrics.counter("owntone_requests_total", "owntone API calls by outcome", ("endpoint", "status"))
+retries_total = metrics.counter("owntone_retries_total", "owntone calls retried after a failure")
+metrics.gauge("owntone_circuit_open", "1 while owntone calls fail fast").set_fn(
+    lambda: 1 if breaker.state == resilience.OPEN else 0
+)
+_STATUS = {1: "1xx", 2: "2xx", 3: "3xx", 4: "4xx", 5: "5xx"}
+_endpoints = {}
+
+
+def endpoint_label(method: str, path: str) -> str:
+    """'PUT /api/outputs/0?x=1' -> 'PUT /api/outputs/:id', cached per raw path."""
+    key = (method, path)
+    label = _endpoints.get(key)
+    if label is None:
+        parts = path.split("?", 1)[0].split("/")
+        label = method + " " + "/".join(":id" if p.isdigit() else p for p in parts)
+        if len(_endpoints) < 256:
+            _endpoints[key] = label
+    return label
+
+
+def status_label(status_code: int) -> str:
+    return _STATUS.get(status_code // 100, "error")
+
+
+def available() -> bool:
+    """False while the breaker is open, i.e. owntone calls would fail fast."""
+    return breaker.state != resilience.OPEN
+
+
+class OwnToneClient:
+    """
+    Owntone JSON API client that reuses keep-alive connections from a
+    pooled session instead of opening a new TCP connection per command.
+    """
+
+    def __init__(self, base_url: str = base, timeout=timeout, pool_size: int = pool_size,
+                 deadline: float = deadline, retries: int = retries, breaker: resilience.CircuitBreaker = breaker):
+        global requests
+        import requests
+        import requests.adapters
+        self.base = base_url.rstrip("/")
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.breaker = breaker
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method: str, path: str, idempotent: bool = None, deadline: float = None, **kwargs):
+        """
+        One owntone call within `deadline` seconds. Connection errors, timeouts
+        and 5xx are retried with jitter when the call is safe to repeat (or
+        never reached owntone); the breaker fails it fast while owntone is down.
+        """
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT
+        timeout = kwargs.pop("timeout", self.timeout)
+        budget = resilience.Deadline(self.deadline if deadline is None else deadline)
+        attempt = 0
+        while True:
+            trial = self.breaker.check()
+            try:
+                response = self._send(method, path, timeout=budget.clamp(timeout), **kwargs)
+            except requests.exceptions.ConnectTimeout as e:
+                error, retry = e, True  # never reached owntone
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error, retry = e, idempotent
+            except BaseException:
+                if trial:
+                    self.breaker.release()
+                raise
+            else:
+                if response.status_code < 500:
+                    self.breaker.success()
+                    response.raise_for_status()
+                    return response
+                error, retry = None, idempotent
+            self.breaker.failure()
+            if retry and attempt < self.retries and budget.remaining() >= resilience.MIN_ATTEMPT:
+                sleep(resilience.retry_delay(attempt, budget))
+                # the jitter may have used up the budget; don't send with a zero timeout
+                retry = budget.remaining() >= resilience.MIN_ATTEMPT
+            else:
+                retry = False
+            if not retry:
+                if error is None:
+                    response.raise_for_status()
+                raise error
+            attempt += 1
+            retries_total.inc()
+
+    def _send(self, method: str, path: str, **kwargs):
+        start = monotonic()
+        status = "error"
+        try:
+            response = self.session.request(method, f"{self.base}{path}", **kwargs)
+            status = status_label(response.status_code)
+            return response
+        except requests.exceptions.Timeout:
+            status = "timeout"
+            raise
+        finally:
+            endpoint = endpoint_label(method, path)
+            request_seconds.labels(endpoint).observe(monotonic() - start)
+            requests_total.labels(endpoint, status).inc()
+
+    def close(self):
+        self.session.close()
+
+    def library(self):
+        return self.request("GET", "/api/library").json()
+
+    def outputs(self):
+        return self.request("GET", "/api/outputs").json()
+
+    def player(self):
+        return self.request("GET", "/api/player").json()
+
+    def album(self, album_id: str):
+        return self.request("GET", f"/api/library/albums/{album_id}").json()
+
+    def album_tracks(self, album_id: str):
+        return self.request("GET", f"/api/library/albums/{album_id}/tracks").json()["items"]
+
+    def volume(self, volume: int, output_id=output):
+        self.request("PUT", f"/api/outputs/{output_id}", json={"volume": volume})
+
+    def repeat(self, state: str):
+        # all, off, single
+        self.request("PUT", f"/api/player/repeat?state={state}")
+
+    def shuffle(self, state: str):
+        # true, false
+        self.request("PUT", f"/api/player/shuffle?state={state}")
+
+    def set_outputs(self, outputs: list[str]):
+        self.request("PUT", "/api/outputs/set", json={"outputs": outputs})
+
+    def pause(self):
+        self.request("PUT", "/api/player/pause")
+
+    def play(self, item_id=None):
+        if item_id is None:
+            self.request("PUT", "/api/player/play")
+        else:
+            self.request("PUT", f"/api/player/play?item_id={item_id}")
+
+    def seek(self, position_ms: int):
+        self.request("PUT", f"/api/player/seek?position_ms={position_ms}")
+
+    def stop(self):
+        self.request("PUT", "/api/player/stop")
+
+    def queue(self, args: dict):
+        Batch(self).add(**args).commit()
+
+    def next(self):
+        self.request("PUT", "/api/player/next", idempotent=False)
+
+    def previous(self):
+        self.request("PUT", "/api/player/previous", idempotent=False)
+
+    def batch(self) -> "Batch":
+        return Batch(self)
+
+
+class Batch:
+    """
+    Collects player changes and sends them in as few requests as possible.
+    Mode changes go first so playback starts already configured: outputs,
+    volume, repeat, then clear + add + shuffle + start as a single add.
+
+        media.batch().repeat("all").add(uris, shuffle="true").commit()
+    """
+
+    def __init__(self, client: OwnToneClient):
+        self.client = client
+        self.outputs = None
+        self.volumes = {}
+        self.repeat_state = None
+        self.shuffle_state = None
+        self.clear_queue = False
+        self.add_args = None
+        self.start = False
+
+    def set_outputs(self, outputs: list[str]):
+        self.outputs = outputs
+        return self
+
+    def volume(self, volume: int, output_id=None):
+        self.volumes[output if output_id is None else output_id] = volume
+        return self
+
+    def repeat(self, state: str):
+        # all, off, single
+        self.repeat_state = state
+        return self
+
+    def shuffle(self, state):
+        # true/false or "true"/"false"
+        self.shuffle_state = "true" if state in (True, "true") else "false"
+        return self
+
+    def clear(self):
+        self.clear_queue = True
+        return self
+
+    def add(self, uris: str, shuffle=None, clear: bool = True, play: bool = True, **params):
+        """Queue `uris` (replacing the queue and starting it by default); extra params go to owntone as-is."""
+        self.add_args = {"uris": uris, **params}
+        if shuffle is not None:
+            self.shuffle(shuffle)
+        self.clear_queue = self.clear_queue or clear
+        self.start = self.start or play
+        return self
+
+    def play(self):
+        self.start = True
+        return self
+
+    def commit(self) -> int:
+        """Send everything collected; returns the number of requests made."""
+        c = self.client
+        sent = 0
+        if self.outputs is not None:
+            c.set_outputs(self.outputs)
+            sent += 1
+        for output_id, volume in self.volumes.items():
+            c.volume(volume, output_id)
+            sent += 1
+        if self.repeat_state is not None:
+            c.repeat(self.repeat_state)
+            sent += 1
+        if self.add_args is not None:
+            args = dict(self.add_args)
+            if self.clear_queue:
+                args["clear"] = "true"
+            if self.shuffle_state is not None:
+                args["shuffle"] = self.shuffle_state
+            if self.start:
+                args["playback"] = "start"
+            q = urlencode(args, safe=":", quote_via=quote)
+            c.request("POST", f"/api/queue/items/add?{q}")
+            return sent + 1
+        if self.clear_queue:
+            c.request("PUT", "/api/queue/clear")
+            sent += 1
+        if self.shuffle_state is not None:
+            c.shuffle(self.shuffle_state)
+            sent += 1
+        if self.start:
+            c.play()
+            sent += 1
+        return sent
+
+
+## Shared client used by the module-level functions below, created on first use
+client = None
+_client_lock = Lock()
+
+
+def shared() -> OwnToneClient:
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                client = OwnToneClient(base, timeout=timeout, pool_size=pool_size)
+    return client
+
+
+def configure(base_url: str = None, timeouts=None, connections: int = None):
+    """Replace the shared client, e.g. to point at another host or tune the pool."""
+    global client, base, timeout, pool_size
+    with _client_lock:
+        old = client
+        base = base_url or base
+        timeout = timeouts or timeout
+        pool_size = connections or pool_size
+        client = OwnToneClient(base, timeout=timeout, pool_size=pool_size)
+    if old:
+        old.close()
+    return client
+
 
 def library():
-    response = get(f"{base}/api/library")
-    response.raise_for_status()
-    return response.json()
+    return shared().library()
 
 
 def outputs():
-    response = get(f"{base}/api/outputs")
-    response.raise_for_status()
-    return response.json()
+    return shared().outputs()
 
 
 def player() -> bool:
-    response = get(f"{base}/api/player")
-    response.raise_for_status()
-    return response.json()
+    return shared().player()
+
+
+def album(album_id: str):
+    return shared().album(album_id)
+
+
+def album_tracks(album_id: str):
+    return shared().album_tracks(album_id)
 
 
 def volume(volume: int):
-    json = {"volume": volume}
-    response = put(f"{base}/api/outputs/{output}", json=json)
-    response.raise_for_status()
+    shared().volume(volume, output)
 
 
 def repeat(state: str):
     # all, off, single
-    response = put(f"{base}/api/player/repeat?state={state}")
-    response.raise_for_status()
+    shared().repeat(state)
 
 
 def shuffle(state: str):
     # true, false
-    response = put(f"{base}/api/player/shuffle?state={state}")
-    response.raise_for_status()
+    shared().shuffle(state)
 
 
 def set_outputs(outputs: list[str]):
-    json = {"outputs": outputs}
-    response = put(f"{base}/api/outputs/set", json=json)
-    response.raise_for_status()
+    shared().set_outputs(outputs)
 
 
 def pause():
-    response = put(f"{base}/api/player/pause")
-    response.raise_for_status()
+    shared().pause()
+
 
+def play(item_id=None):
+    shared().play(item_id)
 
-def play():
-    response = put(f"{base}/api/player/play")
-    response.raise_for_status()
+
+def seek(position_ms: int):
+    shared().seek(position_ms)
 
 
 def stop():
-    response = put(f"{base}/api/player/stop")
-    response.raise_for_status()
+    shared().stop()
 
 
 def queue(args: dict):
-    args['clear'] = 'true'
-    args['playback'] = 'start'
-    q = urlencode(args, safe=":", quote_via=quote)
-    response = post(f"{base}/api/queue/items/add?{q}")
-    response.raise_for_status()
+    shared().queue(args)
 
 
 def next():
-    response = put(f"{base}/api/player/next")
-    response.raise_for_status()
+    shared().next()
 
 
 def previous():
-    response = put(f"{base}/api/player/previous")
-    response.raise_for_status()
+    shared().previous()
+
+
+def batch() -> Batch:
+    return shared().batch()
 
 
 if __name__ == "__main__":
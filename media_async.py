@@ -0,0 +1,226 @@
+import asyncio
+import json as jsonlib
+from time import monotonic
+from urllib.parse import urlencode, urlsplit, quote
+import media
+
+# asyncio counterpart of media.py. Every call is awaitable, honours a
+# per-call timeout and can be cancelled; a cancelled request drops its
+# connection rather than returning it to the pool half-read.
+#
+#   async with AsyncOwnToneClient() as owntone:
+#       await asyncio.gather(owntone.queue(data), owntone.repeat("all"))
+
+
+class OwnToneError(Exception):
+    def __init__(self, status: int, reason: str, body: bytes = b""):
+        super().__init__(f"{status} {reason}")
+        self.status = status
+        self.reason = reason
+        self.body = body
+
+
+class AsyncOwnToneClient:
+    def __init__(self, base_url: str = None, timeout: float = None, pool_size: int = None):
+        url = urlsplit(base_url or media.base)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.timeout = timeout or sum(media.timeout)
+        self.pool_size = pool_size or media.pool_size
+        self._idle = []
+        self._slots = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+        for _, writer in idle:
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def request(self, method: str, path: str, json=None, timeout: float = None):
+        # shares media.breaker: fails fast while owntone is down, no retries here
+        # (the subscriber and the volume task have their own)
+        breaker = media.breaker
+        trial = breaker.check()
+        start = monotonic()
+        status = "error"
+        try:
+            result = await asyncio.wait_for(
+                self._request(method, path, json), timeout or self.timeout
+            )
+            status = "2xx"
+            breaker.success()
+            return result
+        except asyncio.TimeoutError:
+            status = "timeout"
+            breaker.failure()
+            raise
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except OwnToneError as e:
+            status = media.status_label(e.status)
+            if e.status >= 500:
+                breaker.failure()
+            else:
+                breaker.success()
+            raise
+        except (OSError, EOFError):  # EOFError: asyncio.IncompleteReadError
+            breaker.failure()
+            raise
+        finally:
+            if trial:
+                breaker.release()  # no-op once success()/failure() ended the trial
+            endpoint = media.endpoint_label(method, path)
+            media.request_seconds.labels(endpoint).observe(monotonic() - start)
+            media.requests_total.labels(endpoint, status).inc()
+
+    async def _request(self, method, path, json):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        body = jsonlib.dumps(json).encode() if json is not None else b""
+        async with self._slots:
+            reused = bool(self._idle)
+            conn = self._idle.pop() if reused else await self._connect()
+            try:
+                status, reason, keep_alive, data = await self._exchange(conn, method, path, body)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                conn[1].close()
+                if not reused:
+                    raise
+                # owntone closed an idle keep-alive connection; retry once on a fresh one
+                conn = await self._connect()
+                try:
+                    status, reason, keep_alive, data = await self._exchange(conn, method, path, body)
+                except BaseException:
+                    conn[1].close()
+                    raise
+            except BaseException:
+                conn[1].close()
+                raise
+            if keep_alive:
+                self._idle.append(conn)
+            else:
+                conn[1].close()
+        if status >= 400:
+            raise OwnToneError(status, reason, data)
+        return data
+
+    async def _connect(self):
+        return await asyncio.open_connection(self.host, self.port)
+
+    async def _exchange(self, conn, method, path, body):
+        reader, writer = conn
+        head = (
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Accept: application/json\r\n"
+            "Connection: keep-alive\r\n"
+            f"Content-Length: {len(body)}\r\n"
+        )
+        if body:
+            head += "Content-Type: application/json\r\n"
+        writer.write(head.encode() + b"\r\n" + body)
+        await writer.drain()
+
+        status_line = await reader.readuntil(b"\r\n")
+        parts = status_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+        status = int(parts[1])
+        reason = parts[2] if len(parts) > 2 else ""
+        headers = {}
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get("connection", "").lower() != "close"
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            data = bytearray()
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";", 1)[0], 16)
+                if size == 0:
+                    while await reader.readuntil(b"\r\n") != b"\r\n":
+                        pass
+                    break
+                data += await reader.readexactly(size)
+                await reader.readexactly(2)
+            data = bytes(data)
+        elif "content-length" in headers:
+            data = await reader.readexactly(int(headers["content-length"]))
+        elif status in (204, 304) or method == "HEAD":
+            data = b""
+        else:
+            data = await reader.read()
+            keep_alive = False
+        return status, reason, keep_alive, data
+
+    async def get_json(self, path: str, timeout: float = None):
+        return jsonlib.loads(await self.request("GET", path, timeout=timeout))
+
+    async def library(self, timeout: float = None):
+        return await self.get_json("/api/library", timeout)
+
+    async def outputs(self, timeout: float = None):
+        return await self.get_json("/api/outputs", timeout)
+
+    async def player(self, timeout: float = None):
+        return await self.get_json("/api/player", timeout)
+
+    async def album(self, album_id: str, timeout: float = None):
+        return await self.get_json(f"/api/library/albums/{album_id}", timeout)
+
+    async def album_tracks(self, album_id: str, timeout: float = None):
+        return (await self.get_json(f"/api/library/albums/{album_id}/tracks", timeout))["items"]
+
+    async def volume(self, volume: int, output_id=None, timeout: float = None):
+        if output_id is None:
+            output_id = media.output
+        await self.request("PUT", f"/api/outputs/{output_id}", json={"volume": volume}, timeout=timeout)
+
+    async def repeat(self, state: str, timeout: float = None):
+        # all, off, single
+        await self.request("PUT", f"/api/player/repeat?state={state}", timeout=timeout)
+
+    async def shuffle(self, state: str, timeout: float = None):
+        # true, false
+        await self.request("PUT", f"/api/player/shuffle?state={state}", timeout=timeout)
+
+    async def set_outputs(self, outputs: list[str], timeout: float = None):
+        await self.request("PUT", "/api/outputs/set", json={"outputs": outputs}, timeout=timeout)
+
+    async def pause(self, timeout: float = None):
+        await self.request("PUT", "/api/player/pause", timeout=timeout)
+
+    async def play(self, item_id=None, timeout: float = None):
+        path = "/api/player/play" if item_id is None else f"/api/player/play?item_id={item_id}"
+        await self.request("PUT", path, timeout=timeout)
+
+    async def seek(self, position_ms: int, timeout: float = None):
+        await self.request("PUT", f"/api/player/seek?position_ms={position_ms}", timeout=timeout)
+
+    async def stop(self, timeout: float = None):
+        await self.request("PUT", "/api/player/stop", timeout=timeout)
+
+    async def queue(self, args: dict, timeout: float = None):
+        args = dict(args)
+        args['clear'] = 'true'
+        args['playback'] = 'start'
+        q = urlencode(args, safe=":", quote_via=quote)
+        await self.request("POST", f"/api/queue/items/add?{q}", timeout=timeout)
+
+    async def next(self, timeout: float = None):
+        await self.request("PUT", "/api/player/next", timeout=timeout)
+
+    async def previous(self, timeout: float = None):
+        await self.request("PUT", "/api/player/previous", timeout=timeout)
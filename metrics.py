@@ -0,0 +1,198 @@
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# In-process metrics, exported in Prometheus text format on a small local
+# HTTP endpoint:  curl -s http://localhost:9105/metrics
+#
+# Hot paths hold on to a metric (or a labelled child) and only do an
+# attribute add / bucket increment per event. Nothing is allocated until
+# scrape time. Updates are not locked: a racing increment can very rarely be
+# lost, which is fine for monitoring and keeps the Zero 2W's hot paths cheap.
+
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9105
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Gauge:
+    __slots__ = ("value", "fn")
+
+    def __init__(self, fn=None):
+        self.value = 0
+        self.fn = fn
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name, labels):
+        yield name, labels, self.fn() if self.fn else self.value
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            yield name + "_bucket", labels + (("le", repr(bound)),), cumulative
+        yield name + "_bucket", labels + (("le", "+Inf"),), self.count
+        yield name + "_sum", labels, self.sum
+        yield name + "_count", labels, self.count
+
+
+class Family:
+    """A named metric, optionally split by labels; children are created once and reused."""
+
+    def __init__(self, kind, name, help, labelnames=(), factory=None):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.factory = factory
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.labelnames:
+            self.children[()] = factory()
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self.factory())
+        return child
+
+    # unlabelled families act like their single child
+    def inc(self, amount=1):
+        self.children[()].inc(amount)
+
+    def set(self, value):
+        self.children[()].set(value)
+
+    def observe(self, value):
+        self.children[()].observe(value)
+
+    def set_fn(self, fn):
+        """Make an unlabelled gauge report fn() at scrape time."""
+        self.children[()].fn = fn
+
+    def render(self, out):
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+        for values, child in list(self.children.items()):
+            labels = tuple(zip(self.labelnames, values))
+            for name, pairs, value in child.samples(self.name, labels):
+                names = [p[0] for p in pairs]
+                vals = [p[1] for p in pairs]
+                out.append(f"{name}{_label_text(names, vals)} {value}")
+
+
+class Registry:
+    def __init__(self):
+        self.families = {}
+        self.lock = threading.Lock()
+
+    def _family(self, kind, name, help, labelnames, factory):
+        with self.lock:
+            family = self.families.get(name)
+            if family is None:
+                family = self.families[name] = Family(kind, name, help, labelnames, factory)
+            return family
+
+    def counter(self, name, help, labelnames=()):
+        return self._family("counter", name, help, labelnames, Counter)
+
+    def gauge(self, name, help, labelnames=(), fn=None):
+        return self._family("gauge", name, help, labelnames, lambda: Gauge(fn))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._family("histogram", name, help, labelnames, lambda: Histogram(buckets))
+
+    def render(self) -> str:
+        out = []
+        for family in list(self.families.values()):
+            family.render(out)
+        return "\n".join(out) + "\n"
+
+
+registry = Registry()
+counter = registry.counter
+gauge = registry.gauge
+histogram = registry.histogram
+
+
+# ---- Thread liveness ----
+_heartbeats = gauge("thread_last_heartbeat_seconds", "Unix time a worker thread last reported progress", ("thread",))
+_alive = gauge("thread_alive", "1 while a registered thread is running", ("thread",))
+
+
+def heartbeat(thread_name: str):
+    _heartbeats.labels(thread_name).set(time.time())
+
+
+def watch_thread(thread_name: str, thread):
+    _alive.labels(thread_name).fn = lambda: 1 if thread.is_alive() else 0
+
+
+def watch_task(task_name: str, task):
+    _alive.labels(task_name).fn = lambda: 0 if task.done() else 1
+
+
+# ---- HTTP endpoint ----
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f"metrics on http://{host}:{port}/metrics")
+    return server
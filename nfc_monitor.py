@@ -1,11 +1,56 @@
-import digitalio
-import board
+import sys
 import threading
-from adafruit_pn532.spi import PN532_SPI
-from time import sleep
+from time import monotonic
+from nfc_policy import PollingPolicy
+import metrics
+from nfc_trace import Recorder
+
+# board/digitalio/adafruit_pn532 and RPi.GPIO are imported when the reader
+# is opened, so the monitor can be driven by a simulated reader off-Pi
+GPIO = None
+
+# PN532 IRQ line, see the README wiring table
+IRQ_PIN = 25  # GPIO25, physical pin 22
+
+# "irq" arms InListPassiveTarget and sleeps on the IRQ edge; "polling" is the
+# read_passive_target loop, kept as a fallback for boards without IRQ wired
+NFC_MODE = "irq"
+
+# Path to record every raw poll result to (see nfc_trace.py), or None
+NFC_TRACE = None
+
+polls_total = metrics.counter("nfc_polls_total", "PN532 reads, with or without a card")
+errors_total = metrics.counter("nfc_errors_total", "PN532/SPI errors in the monitor loop")
+card_events = metrics.counter("nfc_card_events_total", "Card detections and removals", ("event",))
+poll_rate_gauge = metrics.gauge("nfc_poll_rate", "Reader polls per second over the policy window")
+_detected = card_events.labels("detected")
+_removed = card_events.labels("removed")
+
+
+def open_pn532():
+    import board
+    import digitalio
+    from adafruit_pn532.spi import PN532_SPI
+
+    spi = board.SPI()
+    cs = digitalio.DigitalInOut(board.D7)  # GPIO8 CE0, physical pin 24
+    pn532 = PN532_SPI(spi, cs, reset=None, debug=False)
+    try:
+        ic, ver, rev, support = pn532.firmware_version
+        print(f"PN532 initialized: PN5{ic:02x} Firmware {ver}.{rev}")
+    except Exception as e:
+        print(f"Failed to initialize PN532: {e}")
+        sys.exit(1)
+    pn532.SAM_configuration()
+    # spi/cs are returned so the monitor can release them on shutdown
+    return pn532, (cs, spi)
+
 
 class NFCMonitor:
-    def __init__(self, on_card_detected, on_card_removed):
+    def __init__(self, on_card_detected, on_card_removed, mode: str = None, policy: PollingPolicy = None, reader=None,
+                 recorder: Recorder = None):
+        self.mode = mode or NFC_MODE
+        self.policy = policy or PollingPolicy()
         self.on_card_detected = on_card_detected
         self.on_card_removed = on_card_removed
 
@@ -15,56 +60,129 @@ class NFCMonitor:
         self.last_uid = None
         self.card_present = False
         self.no_card_count = 0
-        self.no_card_threshold = 3  # consecutive misses before removal
-        # Initialize PN532 SPI
-        spi = board.SPI()
-        cs = digitalio.DigitalInOut(board.D7)  # GPIO8 CE0, physical pin 24
-        self.pn532 = PN532_SPI(spi, cs, reset=None, debug=False)
-        try:
-            ic, ver, rev, support = self.pn532.firmware_version
-            print(f"PN532 initialized: PN5{ic:02x} Firmware {ver}.{rev}")
-        except Exception as e:
-            print(f"Failed to initialize PN532: {e}")
-            sys.exit(1)
-        self.pn532.SAM_configuration()
+        self.last_seen = 0.0
+        self.armed = False
+        self.irq_ready = False
+        # Anything with the PN532_SPI read methods works, e.g. a scripted reader
+        self.hardware = ()
+        if reader is None:
+            reader, self.hardware = open_pn532()
+        self.pn532 = reader
+        self.recorder = recorder or (Recorder(NFC_TRACE, self.mode) if NFC_TRACE else None)
+        poll_rate_gauge.set_fn(self.poll_rate)
 
     def pn532():
         return self.pn532
 
-    def monitor_loop(self):
-        while not self.stop_flag.is_set():
+    def poll_rate(self) -> float:
+        """Effective reader polls per second, as scheduled by the policy."""
+        return self.policy.rate()
+
+    def handle_uid(self, uid, now: float = None):
+        now = monotonic() if now is None else now
+        self.policy.on_poll(now)
+        polls_total.inc()
+        metrics.heartbeat("nfc")
+        if self.recorder:
+            self.recorder.poll(uid, now)
+        if uid:
+            uid_str = "".join("{:02X}".format(b) for b in uid)
+            self.last_seen = now
+            self.no_card_count = 0
+            if not self.card_present:
+                self.card_present = True
+                self.last_uid = uid_str
+                self.policy.on_change(now)
+                _detected.inc()
+                self.on_card_detected(uid_str)
+            elif uid_str != self.last_uid:
+                self.last_uid = uid_str
+                self.policy.on_change(now)
+                _detected.inc()
+                self.on_card_detected(uid_str)
+        else:
+            if self.card_present:
+                self.no_card_count += 1
+                if self.policy.removed(now, self.last_seen, self.no_card_count):
+                    self.card_present = False
+                    self.last_uid = None
+                    self.no_card_count = 0
+                    self.policy.on_change(now)
+                    _removed.inc()
+                    self.on_card_removed()
+            else:
+                self.no_card_count = 0
+
+    def setup_irq(self):
+        global GPIO
+        import RPi.GPIO as GPIO
+        try:
+            GPIO.setmode(GPIO.BCM)
+        except ValueError:
+            pass  # pin numbering already chosen by another module
+        GPIO.setup(IRQ_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        self.irq_ready = True
+
+    def wait_irq(self, timeout: float) -> bool:
+        # IRQ is active low; it may already be asserted before we start waiting
+        if GPIO.input(IRQ_PIN) == 0:
+            return True
+        return GPIO.wait_for_edge(IRQ_PIN, GPIO.FALLING, timeout=int(timeout * 1000)) is not None
+
+    def prepare(self):
+        """Set up the IRQ line, or drop to polling if it isn't available."""
+        if self.mode == "irq" and not self.irq_ready:
             try:
-                uid = self.pn532.read_passive_target(timeout=0.1)
-                if uid:
-                    uid_str = "".join("{:02X}".format(b) for b in uid)
-                    if not self.card_present:
-                        self.card_present = True
-                        self.last_uid = uid_str
-                        self.no_card_count = 0
-                        self.on_card_detected(uid_str)
-                    elif uid_str != self.last_uid:
-                        self.last_uid = uid_str
-                        self.on_card_detected(uid_str)
-                    else:
-                        self.no_card_count = 0
-                else:
-                    if self.card_present:
-                        self.no_card_count += 1
-                        if self.no_card_count >= self.no_card_threshold:
-                            self.card_present = False
-                            self.last_uid = None
-                            self.no_card_count = 0
-                            self.on_card_removed()
-                    else:
-                        self.no_card_count = 0
-
-                if self.card_present:
-                    sleep(0.3)
-                else:
-                    sleep(0.1)
+                self.setup_irq()
             except Exception as e:
-                print(f"❌ NFC polling error: {e}")
-                sleep(1)
+                print(f"PN532 IRQ unavailable ({e}); falling back to polling")
+                self.mode = "polling"
+
+    def step(self) -> float:
+        """One blocking reader round; returns how long to wait before the next one."""
+        try:
+            return self.irq_step() if self.mode == "irq" else self.poll_step()
+        except Exception as e:
+            self.handle_error(e)
+            return 1.0
+
+    def handle_error(self, error, now: float = None):
+        self.armed = False
+        errors_total.inc()
+        print(f"❌ NFC {'IRQ' if self.mode == 'irq' else 'polling'} error: {error}")
+        if self.recorder:
+            self.recorder.error(error, monotonic() if now is None else now)
+
+    def irq_step(self) -> float:
+        if not self.armed:
+            self.armed = self.pn532.listen_for_passive_target(timeout=0.1)
+            if not self.armed:
+                return 0.1
+
+        # A present card answers right after arming, so a short silence
+        # counts as a miss. With no card the PN532 keeps listening and
+        # we only wake up to check the stop flag.
+        if not self.wait_irq(self.policy.read_timeout if self.card_present else 1.0):
+            if self.card_present:
+                self.handle_uid(None)
+            return 0.0
+
+        uid = self.pn532.get_passive_target(timeout=self.policy.read_timeout)
+        self.armed = False
+        self.handle_uid(uid)
+        return self.policy.next_interval(monotonic(), True) if self.card_present else 0.0
+
+    def poll_step(self) -> float:
+        uid = self.pn532.read_passive_target(timeout=self.policy.read_timeout)
+        self.handle_uid(uid)
+        return self.policy.next_interval(monotonic(), self.card_present)
+
+    def monitor_loop(self):
+        self.prepare()
+        while not self.stop_flag.is_set():
+            delay = self.step()
+            if delay:
+                self.stop_flag.wait(delay)
 
     def start(self):
         if self.thread and self.thread.is_alive():
@@ -72,9 +190,26 @@ class NFCMonitor:
         self.stop_flag.clear()
         self.thread = threading.Thread(target=self.monitor_loop, daemon=True)
         self.thread.start()
+        metrics.watch_thread("nfc", self.thread)
 
     def stop(self):
         self.stop_flag.set()
         if self.thread:
             self.thread.join()
 
+    def close(self):
+        """Power the reader down and release the IRQ pin and SPI bus."""
+        try:
+            if hasattr(self.pn532, "power_down"):
+                self.pn532.power_down()
+        except Exception as e:
+            print(f"PN532 power down failed: {e}")
+        if self.irq_ready:
+            GPIO.cleanup(IRQ_PIN)
+            self.irq_ready = False
+        for device in self.hardware:
+            device.deinit()
+        self.hardware = ()
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
@@ -0,0 +1,86 @@
+from time import monotonic
+
+# Tunables per deployment: removal latency vs SPI/CPU load
+FAST_INTERVAL = 0.1      # seconds between polls right after a change
+PRESENT_INTERVAL = 0.2   # seconds between polls while a card sits on the reader
+MAX_INTERVAL = 1.0       # idle polling backs off up to this
+BACKOFF = 2.0            # idle interval multiplier per poll
+IDLE_AFTER = 5.0         # seconds without a change before backing off
+REMOVAL_MS = 600         # card must be unseen this long before it counts as removed
+MIN_MISSES = 2           # ...and missed at least this many polls in a row
+READ_TIMEOUT = 0.1       # read_passive_target / IRQ wait per poll
+
+
+class PollingPolicy:
+    """
+    Decides how long NFCMonitor waits between polls and when a card that
+    stopped answering counts as removed.
+
+    Polls aggressively right after a card change, backs off exponentially
+    while the reader sits idle, and confirms removal by elapsed time rather
+    than by a count of misses so the latency doesn't depend on poll speed.
+    """
+
+    def __init__(
+        self,
+        fast_interval: float = FAST_INTERVAL,
+        present_interval: float = PRESENT_INTERVAL,
+        max_interval: float = MAX_INTERVAL,
+        backoff: float = BACKOFF,
+        idle_after: float = IDLE_AFTER,
+        removal_ms: int = REMOVAL_MS,
+        min_misses: int = MIN_MISSES,
+        read_timeout: float = READ_TIMEOUT,
+        rate_window: float = 10.0,
+    ):
+        self.fast_interval = fast_interval
+        self.present_interval = present_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.idle_after = idle_after
+        self.removal_ms = removal_ms
+        self.min_misses = min_misses
+        self.read_timeout = read_timeout
+        self.rate_window = rate_window
+
+        now = monotonic()
+        self.last_change = now
+        self.interval = fast_interval
+        self._window_start = now
+        self._window_polls = 0
+        self._rate = 0.0
+
+    def on_poll(self, now: float):
+        self._window_polls += 1
+        if now - self._window_start >= self.rate_window:
+            self._rate = self._window_polls / (now - self._window_start)
+            self._window_start = now
+            self._window_polls = 0
+
+    def on_change(self, now: float):
+        self.last_change = now
+        self.interval = self.fast_interval
+
+    def removed(self, now: float, last_seen: float, misses: int) -> bool:
+        # The miss count guards against a single miss after a long stall
+        # (e.g. a slow callback) looking like a card that has been gone for ages
+        return misses >= self.min_misses and (now - last_seen) * 1000 >= self.removal_ms
+
+    def next_interval(self, now: float, card_present: bool) -> float:
+        if card_present:
+            # Keep a removal check well inside the confirmation window
+            self.interval = min(self.present_interval, self.removal_ms / 2000)
+        elif now - self.last_change < self.idle_after:
+            self.interval = self.fast_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        return self.interval
+
+    def rate(self, now: float = None) -> float:
+        """Effective polls per second over the last window."""
+        now = monotonic() if now is None else now
+        elapsed = now - self._window_start
+        if elapsed >= self.rate_window or not self._rate:
+            # first window, or it went stale (e.g. idle in IRQ mode)
+            return self._window_polls / elapsed if elapsed > 0 else 0.0
+        return self._rate
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Record and replay raw PN532 poll results.
+
+A trace is a text file with one poll per line, in milliseconds since the
+recording started:
+
+    # nfc-trace 1 2026-10-18T20:15:02 mode=irq
+    0 M
+    103 U 21761305
+    305 U 21761305
+    512 M
+    530 E timeout waiting for ACK
+
+U is a read UID, M a miss (no card answered), E a reader/SPI error.
+
+Record on the player by setting NFC_TRACE in nfc_monitor.py, or standalone:
+
+    python nfc_trace.py record nfc.trace
+
+Replay through NFCMonitor with different removal settings, instantly or at
+a given speed:
+
+    python nfc_trace.py replay nfc.trace --removal-ms 400 --min-misses 3
+    python nfc_trace.py replay nfc.trace --speed 4
+
+TraceReader plays a trace back as a PN532 stand-in instead, so the normal
+poll loop (and anything behind it, e.g. benchmarks/latency.py --trace)
+samples it in real time.
+"""
+import argparse
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime
+
+HEADER = "# nfc-trace 1"
+
+UID, MISS, ERROR = "U", "M", "E"
+
+
+class Recorder:
+    """Appends poll results to a trace file; safe to call from the reader thread only."""
+
+    def __init__(self, path: str, mode: str = ""):
+        self.file = open(path, "w")
+        self.start = None
+        self.file.write(f"{HEADER} {datetime.now().isoformat(timespec='seconds')} mode={mode}\n")
+
+    def _stamp(self, now: float) -> int:
+        if self.start is None:
+            self.start = now
+        return round((now - self.start) * 1000)
+
+    def poll(self, uid, now: float = None):
+        now = time.monotonic() if now is None else now
+        if uid:
+            self.file.write(f"{self._stamp(now)} {UID} {bytes(uid).hex().upper()}\n")
+        else:
+            self.file.write(f"{self._stamp(now)} {MISS}\n")
+
+    def error(self, message, now: float = None):
+        now = time.monotonic() if now is None else now
+        message = " ".join(str(message).split())  # keep it on one line
+        self.file.write(f"{self._stamp(now)} {ERROR} {message}\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def load(path: str):
+    """[(seconds, kind, uid-or-message), ...] in file order."""
+    events = []
+    with open(path) as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split(" ", 2)
+            try:
+                t, kind = int(parts[0]) / 1000, parts[1]
+            except (IndexError, ValueError):
+                raise ValueError(f"{path}:{n}: bad trace line {line!r}")
+            if kind not in (UID, MISS, ERROR):
+                raise ValueError(f"{path}:{n}: unknown event {kind!r}")
+            events.append((t, kind, parts[2] if len(parts) > 2 else None))
+    return events
+
+
+def replay(events, monitor, speed: float = 0, base: float = None):
+    """
+    Feed recorded polls straight into monitor.handle_uid/handle_error with
+    the recorded timestamps (offset by `base`), so removal decisions match
+    the trace exactly. speed=0 runs as fast as possible; otherwise sleeps to
+    keep pace (1 = real time).
+    """
+    base = time.monotonic() if base is None else base
+    for t, kind, value in events:
+        if speed:
+            delay = base + t / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        now = base + t
+        if kind == ERROR:
+            monitor.handle_error(value, now)
+        else:
+            monitor.handle_uid(bytes.fromhex(value) if kind == UID else None, now)
+    return base
+
+
+class TraceReader:
+    """
+    PN532_SPI stand-in that answers each read with whatever the trace had
+    at that moment, with the clock starting at the first read. Recorded
+    errors are raised once, by the first read that gets past them.
+    """
+
+    def __init__(self, events, speed: float = 1.0):
+        self.events = events
+        self.times = [t for t, _, _ in events]
+        self.errors = [i for i, (_, kind, _) in enumerate(events) if kind == ERROR]
+        self.raised = 0
+        self.speed = speed
+        self.start = None
+        self.finished = threading.Event()
+
+    def read_passive_target(self, card_baud=0, timeout: float = 1):
+        now = time.monotonic()
+        if self.start is None:
+            self.start = now
+        t = (now - self.start) * self.speed
+        if not self.events or t > self.times[-1]:
+            self.finished.set()
+        i = bisect_right(self.times, t) - 1
+
+        if self.raised < len(self.errors) and self.errors[self.raised] <= i:
+            while self.raised < len(self.errors) and self.errors[self.raised] <= i:
+                self.raised += 1
+            raise RuntimeError(self.events[self.errors[self.raised - 1]][2])
+
+        while i >= 0 and self.events[i][1] == ERROR:
+            i -= 1
+        if i >= 0 and self.events[i][1] == UID:
+            return bytearray(bytes.fromhex(self.events[i][2]))
+        time.sleep(timeout)  # the real reader waits out the timeout with no card
+        return None
+
+    def listen_for_passive_target(self, card_baud=0, timeout: float = 1):
+        return True
+
+    def get_passive_target(self, timeout: float = 1):
+        return self.read_passive_target(timeout=timeout)
+
+
+def _record(args):
+    import nfc_monitor
+
+    recorder = Recorder(args.path, args.mode or nfc_monitor.NFC_MODE)
+    monitor = nfc_monitor.NFCMonitor(
+        on_card_detected=lambda uid: print(f"card {uid}"),
+        on_card_removed=lambda: print("removed"),
+        mode=args.mode,
+        recorder=recorder,
+    )
+    print(f"recording to {args.path}, Ctrl+C to stop")
+    monitor.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        monitor.stop()
+        monitor.close()
+
+
+def _replay(args):
+    from nfc_monitor import NFCMonitor
+    from nfc_policy import PollingPolicy
+
+    events = load(args.path)
+    policy = PollingPolicy(removal_ms=args.removal_ms, min_misses=args.min_misses)
+    base = time.monotonic()
+    log = []
+    # the policy's last_change is the `now` of the poll that fired the callback
+    monitor = NFCMonitor(
+        on_card_detected=lambda uid: log.append((policy.last_change - base, "detected", uid)),
+        on_card_removed=lambda: log.append((policy.last_change - base, "removed", None)),
+        mode="polling",
+        policy=policy,
+        reader=TraceReader(events),  # never read, replay() drives the monitor
+    )
+    replay(events, monitor, args.speed, base)
+
+    misses = sum(1 for _, kind, _ in events if kind == MISS)
+    errors = sum(1 for _, kind, _ in events if kind == ERROR)
+    duration = events[-1][0] if events else 0
+    print(f"{len(events) - errors} polls over {duration:.1f}s: {misses} misses, {errors} errors")
+    print(f"removal_ms={policy.removal_ms} min_misses={policy.min_misses}")
+    flaps = 0
+    for i, (t, event, uid) in enumerate(log):
+        print(f"{t:9.3f}s  {event}" + (f" {uid}" if uid else ""))
+        # the same card back within a few seconds of a removal is most likely a flaky read
+        if event == "removed" and 0 < i < len(log) - 1:
+            next_t, next_event, next_uid = log[i + 1]
+            if next_event == "detected" and next_uid == log[i - 1][2] and next_t - t < args.flap_s:
+                flaps += 1
+    detections = sum(1 for _, event, _ in log if event == "detected")
+    print(f"{detections} detections, {len(log) - detections} removals, "
+          f"{flaps} likely spurious (same card back within {args.flap_s:g}s)")
+
+
+if __name__ == "__main__":
+    from nfc_policy import REMOVAL_MS, MIN_MISSES
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="record poll results from the PN532")
+    rec.add_argument("path")
+    rec.add_argument("--mode", choices=("irq", "polling"))
+    rep = sub.add_parser("replay", help="replay a trace through NFCMonitor")
+    rep.add_argument("path")
+    rep.add_argument("--speed", type=float, default=0, help="0 = instant (default), 1 = real time")
+    rep.add_argument("--removal-ms", type=int, default=REMOVAL_MS)
+    rep.add_argument("--min-misses", type=int, default=MIN_MISSES)
+    rep.add_argument("--flap-s", type=float, default=3.0, help="re-detect window counted as a spurious removal")
+    args = parser.parse_args()
+    _record(args) if args.command == "record" else _replay(args)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Gzip the Pico W helper's web page.
+
+code.py streams www/index.html.gz from flash as-is (Content-Encoding: gzip)
+and uses the hash in www/index.html.gz.etag as its ETag, so browsers get a
+304 until the page changes. Run this after editing www/index.html, then copy
+www/ to CIRCUITPY:
+
+    python build-ui.py
+"""
+import gzip
+import hashlib
+import os
+
+WWW = os.path.join(os.path.dirname(os.path.abspath(__file__)), "www")
+
+
+def build(page: str = "index.html"):
+    src = os.path.join(WWW, page)
+    with open(src, "rb") as f:
+        html = f.read()
+    # mtime=0 keeps the output (and so the ETag) identical for identical input
+    data = gzip.compress(html, compresslevel=9, mtime=0)
+    etag = hashlib.sha256(data).hexdigest()[:16]
+    with open(src + ".gz", "wb") as f:
+        f.write(data)
+    with open(src + ".gz.etag", "w") as f:
+        f.write(etag + "\n")
+    print(f"{src}: {len(html)} -> {len(data)} bytes, etag {etag}")
+
+
+if __name__ == "__main__":
+    build()
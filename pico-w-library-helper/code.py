@@ -1,10 +1,14 @@
 # code.py — Pico W (CircuitPython) web UI + PN532 + Redis + search proxy
 
+import os
 import time
+import errno
+import asyncio  # not built in: copy asyncio/ and adafruit_ticks.mpy from the CircuitPython bundle to lib/
 import wifi
 import socketpool
 import ipaddress
 import json
+from collections import OrderedDict
 from secrets import secrets  # {"ssid":"...", "password":"...", "redis_password":"..."}
 
 # ---- Configuration ----
@@ -19,8 +23,30 @@ REDIS_PASSWORD = secrets.get("redis_password")
 MUSIC_HOST = "192.168.0.142"   # <-- change to "192.168.0.xx" if needed
 MUSIC_PORT = 3689
 
+# Album metadata cache for /lookup and /set conflicts (hits/misses on /health)
+ALBUM_CACHE_BYTES = 8 * 1024   # budget for cached strings (UTF-8 bytes + overhead); oldest entries go first
+ALBUM_CACHE_TTL = 600          # seconds before an album is fetched again
+
+# /albums: album-only search, trimmed to what the UI shows, with a small
+# query cache. A longer query is answered from a cached shorter one it
+# contains, as long as that result wasn't cut off by the limit.
+SEARCH_LIMIT = 30
+SEARCH_CACHE_SIZE = 4          # queries kept
+SEARCH_CACHE_TTL = 120
+
 # PN532 wiring (SPI1 on Pico W): SCK=GP10(14), MOSI=GP11(15), MISO=GP12(16), CS=GP8(11)
 USE_PN532 = True  # set False if you want to run without the PN532 connected
+NFC_POLL_INTERVAL = 0.1  # seconds between checks for a card (each check blocks ~30 ms)
+
+# HTTP server: connections are served concurrently; each gets CONN_TIMEOUT
+# seconds for the whole request/response before it is dropped
+MAX_CONNECTIONS = 4
+CONN_TIMEOUT = 5.0
+# Outgoing connections (Redis, OwnTone): connect() can't yield, so it gets a
+# short timeout; after that, reads and writes yield like the server's do
+UPSTREAM_CONNECT_TIMEOUT = 0.5
+REQUEST_BUF = 2048
+PROXY_BUF = 1024  # /search streams the upstream body through one buffer of this size
 
 # ---- PN532 (SPI1) ----
 last_uid = ""  # updated as we read cards
@@ -49,16 +75,27 @@ if USE_PN532:
         print("PN532 init failed:", repr(e))
         USE_PN532 = False
 
-def poll_nfc_once():
+async def nfc_task():
+    """
+    Keeps last_uid current without blocking the server: the PN532 is told to
+    look for a card and then only asked, briefly, whether it found one.
+    """
     global last_uid
-    if not USE_PN532:
-        return
-    try:
-        uid = pn.read_passive_target(timeout=0.2)  # was 0.01
-        if uid:
-            last_uid = "".join(["%02X" % b for b in uid])
-    except Exception:
-        pass
+    armed = False
+    while USE_PN532:
+        try:
+            if not armed:
+                armed = bool(pn.listen_for_passive_target(timeout=0.1))
+            else:
+                uid = pn.get_passive_target(timeout=0.03)
+                if uid:
+                    last_uid = "".join(["%02X" % b for b in uid])
+                    armed = False  # look again, so a new card is picked up
+        except Exception as e:
+            print("PN532 read failed:", repr(e))
+            armed = False
+            await asyncio.sleep(1.0)
+        await asyncio.sleep(NFC_POLL_INTERVAL)
 
 
 # ---- Redis minimal client (RESP2) ----
@@ -73,65 +110,290 @@ def _resp_array(items):
         out += _resp_bulk(it)
     return out
 
-# ---- Tiny HTTP helpers ----
-def redis_get_str(key):
+class RedisError(Exception):
+    pass
+
+class RedisClient:
+    """
+    One persistent connection, opened (and AUTHed) on first use and again
+    after any socket error. pipeline() sends several commands in one write
+    and reads their replies in order; reads and writes yield to other tasks
+    (see Conn), and each pipeline gets `timeout` seconds to finish.
+    """
+    def __init__(self, pool, host, port, password=None, timeout=3.0):
+        self.pool = pool
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self.conn = None
+        self.lock = asyncio.Lock()  # one pipeline at a time, so replies stay in order
+        self.chunk = bytearray(512)
+        self.rbuf = b""
+        self.pos = 0
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+        self.conn = None
+
+    async def _connect(self):
+        self.conn = open_conn(self.pool, self.host, self.port, self.timeout)
+        self.rbuf, self.pos = b"", 0
+        try:
+            if self.password:
+                await self.conn.send_all(_resp_array([b"AUTH", self.password]))
+                reply = await self._reply()
+                if isinstance(reply, RedisError):
+                    raise reply
+        except Exception:
+            self.close()
+            raise
+
+    async def pipeline(self, *commands):
+        """
+        await pipeline(("GET", "a"), ("SET", "b", "1")) -> ["...", "OK"].
+        Raises RedisError if any command failed (after reading every reply).
+        """
+        payload = b"".join(_resp_array(c) for c in commands)
+        async with self.lock:
+            while True:
+                reused = self.conn is not None
+                if reused:
+                    self.conn.deadline = time.monotonic() + self.timeout
+                else:
+                    await self._connect()
+                try:
+                    await self.conn.send_all(payload)
+                    replies = []
+                    for _ in commands:
+                        replies.append(await self._reply())
+                    break
+                except OSError:
+                    self.close()
+                    if not reused:
+                        raise
+                    # Redis dropped the idle connection; reconnect once and resend
+        for r in replies:
+            if isinstance(r, RedisError):
+                raise r
+        return replies
+
+    async def command(self, *args):
+        return (await self.pipeline(args))[0]
+
+    # -- RESP2 reply parsing --
+    async def _fill(self):
+        if self.pos:
+            self.rbuf, self.pos = self.rbuf[self.pos:], 0
+        n = await self.conn.recv_into(self.chunk)
+        if not n:
+            raise OSError("redis closed the connection")
+        self.rbuf += bytes(self.chunk[:n])
+
+    async def _line(self):
+        while True:
+            i = self.rbuf.find(b"\r\n", self.pos)
+            if i != -1:
+                line, self.pos = self.rbuf[self.pos:i], i + 2
+                return line
+            await self._fill()
+
+    async def _reply(self):
+        """Next reply: str, int, None (nil), list, or a RedisError for -ERR."""
+        line = await self._line()
+        kind, rest = line[:1], line[1:]
+        if kind == b"+":
+            return rest.decode("utf-8", "ignore")
+        if kind == b"-":
+            return RedisError(rest.decode("utf-8", "ignore"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            while len(self.rbuf) - self.pos < n + 2:
+                await self._fill()
+            data, self.pos = self.rbuf[self.pos:self.pos + n], self.pos + n + 2
+            return data.decode("utf-8", "ignore")
+        if kind == b"*":
+            n = int(rest)
+            if n < 0:
+                return None
+            items = []
+            for _ in range(n):
+                items.append(await self._reply())
+            return items
+        self.close()
+        raise OSError("bad redis reply: " + repr(line))
+
+async def redis_get_str(key):
     """GET key -> str or None."""
-    raw = redis_cmd(pool, b"GET", key)
-    val = parse_redis_simple(raw)
+    val = await redis.command("GET", key)
     return val if isinstance(val, str) else None
 
-def fetch_album(pool_obj, album_id):
+# ---- Tiny HTTP helpers ----
+class AlbumCache:
     """
-    Fetch album metadata from the music server.
-    Returns a dict (parsed JSON) on success, or None on failure.
+    LRU of album id -> (artist, name, artwork_url) with a TTL. Entries are
+    charged their UTF-8 sizes plus a fixed overhead, and the least
+    recently used ones are dropped to stay under max_bytes.
     """
-    try:
-        status, body = http_get_json_via_proxy(pool_obj, MUSIC_HOST, MUSIC_PORT, "/api/library/albums/" + album_id)
-        if status == 200 and body:
-            try:
-                return json.loads(body.decode("utf-8"))
-            except Exception:
+    ENTRY_OVERHEAD = 64  # tuple, dict slot, float
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # id -> (expires, size, artist, name, artwork_url)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, album_id):
+        e = self.entries.get(album_id)
+        if e is not None and e[0] <= time.monotonic():
+            self._drop(album_id)
+            e = None
+        if e is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.pop(album_id)
+        self.entries[album_id] = e  # most recently used goes last
+        return e[2:]
+
+    def put(self, album_id, artist, name, artwork_url):
+        size = self.ENTRY_OVERHEAD
+        for s in (album_id, artist, name, artwork_url or ""):
+            size += len(s.encode("utf-8"))  # code points under-count non-ASCII names
+        if size > self.max_bytes:
+            return
+        if album_id in self.entries:
+            self._drop(album_id)
+        while self.bytes + size > self.max_bytes:
+            self._drop(next(iter(self.entries)))
+        self.entries[album_id] = (time.monotonic() + self.ttl, size, artist, name, artwork_url)
+        self.bytes += size
+
+    def _drop(self, album_id):
+        self.bytes -= self.entries.pop(album_id)[1]
+
+album_cache = AlbumCache(ALBUM_CACHE_BYTES, ALBUM_CACHE_TTL)
+
+async def fetch_album(pool_obj, album_id):
+    """
+    Album metadata from the cache or the music server: a dict with artist,
+    name and (if the server has one) artwork_url, or None on failure.
+    """
+    hit = album_cache.get(album_id)
+    if hit is None:
+        try:
+            status, body = await http_get_json_via_proxy(pool_obj, MUSIC_HOST, MUSIC_PORT, "/api/library/albums/" + album_id)
+            if status != 200 or not body:
                 return None
-        return None
+            meta = json.loads(body.decode("utf-8"))
+        except Exception:
+            return None
+        hit = (meta.get("artist") or "", meta.get("name") or "", meta.get("artwork_url"))
+        album_cache.put(album_id, *hit)
+    artist, name, artwork_url = hit
+    meta = {"artist": artist, "name": name}
+    if artwork_url is not None:
+        meta["artwork_url"] = artwork_url
+    return meta
+
+_WOULD_BLOCK = (errno.EAGAIN, errno.ETIMEDOUT)
+
+class Conn:
+    """
+    Non-blocking client socket for the asyncio server. Reads and writes yield
+    to other tasks while the socket is not ready, and everything fails with
+    ETIMEDOUT once the connection's deadline has passed.
+    """
+    def __init__(self, sock, timeout=CONN_TIMEOUT):
+        sock.settimeout(0)
+        self.sock = sock
+        self.deadline = time.monotonic() + timeout
+        self.sent = 0
+
+    async def _wait(self):
+        if time.monotonic() > self.deadline:
+            raise OSError(errno.ETIMEDOUT)
+        await asyncio.sleep(0.01)
+
+    async def recv_into(self, mv):
+        while True:
+            try:
+                return self.sock.recv_into(mv)
+            except OSError as e:
+                if e.errno not in _WOULD_BLOCK:
+                    raise
+            await self._wait()
+
+    async def send_all(self, data, chunk=1024):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        mv = memoryview(data)
+        total = 0
+        while total < len(mv):
+            try:
+                sent = self.sock.send(mv[total: total + chunk])
+            except OSError as e:
+                if e.errno not in _WOULD_BLOCK:
+                    raise
+                sent = 0
+            if sent:
+                total += sent
+                self.sent += sent
+            else:
+                await self._wait()
+
+    def close(self):
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+
+def open_conn(pool_obj, host, port, timeout=CONN_TIMEOUT):
+    """
+    Conn to host:port. Only connect() blocks, for UPSTREAM_CONNECT_TIMEOUT at
+    most, so a host that is down can't hold up the other tasks for long.
+    """
+    s = pool_obj.socket(pool_obj.AF_INET, pool_obj.SOCK_STREAM)
+    try:
+        s.settimeout(UPSTREAM_CONNECT_TIMEOUT)
+        s.connect((host, port))
+        return Conn(s, timeout)
     except Exception:
-        return None
-    
-def _send_all(conn, data, chunk=1024):
-    """Send all bytes in small chunks to avoid resets."""
-    if isinstance(data, str):
-        data = data.encode("utf-8")
-    mv = memoryview(data)
-    total = 0
-    L = len(mv)
-    while total < L:
-        sent = conn.send(mv[total: total + chunk])
-        if not sent:
-            break
-        total += sent
+        s.close()
+        raise
 
-def http_send(conn, status="200 OK", body=b"OK", ctype="text/plain"):
-    if isinstance(body, str):
-        body = body.encode("utf-8")
-    headers = (
+def http_headers(status, ctype, length=None, extra=""):
+    """Response head; without a length the body simply ends when we close."""
+    return (
         "HTTP/1.1 " + status + "\r\n"
         "Content-Type: " + ctype + "\r\n"
-        "Content-Length: " + str(len(body)) + "\r\n"
+        + ("" if length is None else "Content-Length: " + str(length) + "\r\n") + extra +
         "Connection: close\r\n"
         "\r\n"
     )
-    _send_all(conn, headers)
-    _send_all(conn, body)
 
-def read_http_request(conn, buf, timeout_s=3.0):
+async def http_send(conn, status="200 OK", body=b"OK", ctype="text/plain"):
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    await conn.send_all(http_headers(status, ctype, len(body)))
+    await conn.send_all(body)
+
+async def read_http_request(conn, buf):
     """
     Read until end-of-headers or buffer fills. Returns a decoded request string
     or '' on timeout/empty.
     """
-    conn.settimeout(timeout_s)
     total = 0
     while True:
         try:
-            n = conn.recv_into(memoryview(buf)[total:])
+            n = await conn.recv_into(memoryview(buf)[total:])
         except Exception:
             # timeout or recv error
             break
@@ -146,53 +408,6 @@ def read_http_request(conn, buf, timeout_s=3.0):
         return ""
     return bytes(memoryview(buf)[:total]).decode("utf-8", "ignore")
 
-def _recv_once(sock, maxlen=4096, timeout=2.0):
-    buf = bytearray(maxlen)
-    try:
-        sock.settimeout(timeout)
-        n = sock.recv_into(buf)
-        if not n:
-            return b""
-        return bytes(memoryview(buf)[:n])
-    except Exception:
-        return b""
-
-def redis_cmd(pool, cmd: bytes, *args: str) -> bytes:
-    s = pool.socket(pool.AF_INET, pool.SOCK_STREAM)
-    try:
-        s.settimeout(3)
-        s.connect((REDIS_HOST, REDIS_PORT))
-        if REDIS_PASSWORD:
-            s.send(_resp_array([b"AUTH", REDIS_PASSWORD]))
-            _ = _recv_once(s, 256, 2.0)  # +OK or -ERR
-        s.send(_resp_array([cmd] + list(args)))
-        return _recv_once(s, 4096, 2.0)
-    finally:
-        s.close()
-
-def parse_redis_simple(resp):
-    if not resp:
-        return None
-    if resp.startswith(b"+"):          # +OK
-        return resp[1:].split(b"\r\n",1)[0].decode("utf-8","ignore")
-    if resp.startswith(b"$-1"):        # nil
-        return None
-    if resp.startswith(b"$"):          # $<len>\r\n<data>\r\n
-        nl = resp.find(b"\r\n")
-        if nl == -1: return None
-        try:
-            ln = int(resp[1:nl])
-        except Exception:
-            return None
-        start = nl + 2
-        return resp[start:start+ln].decode("utf-8","ignore")
-    if resp.startswith(b"-"):          # -ERR ...
-        return resp.decode("utf-8","ignore")
-    if resp.startswith(b":"):          # :<int>
-        try: return int(resp[1:].split(b"\r\n",1)[0])
-        except Exception: return None
-    return resp.decode("utf-8","ignore")
-
 def url_decode(s):
     out, i = [], 0
     while i < len(s):
@@ -208,6 +423,26 @@ def url_decode(s):
             out.append(ch); i += 1
     return "".join(out)
 
+def request_header(req_text, name):
+    """Value of a request header (name in lower case), or ''."""
+    for line in req_text.split("\r\n")[1:]:
+        if not line:
+            break
+        k, _, v = line.partition(":")
+        if k.strip().lower() == name:
+            return v.strip()
+    return ""
+
+def url_encode(s):
+    out = []
+    for b in s.encode("utf-8"):
+        c = chr(b)
+        if b < 128 and (c.isalpha() or c.isdigit() or c in "-_.~,"):
+            out.append(c)
+        else:
+            out.append("%%%02X" % b)
+    return "".join(out)
+
 def parse_query(qs: str) -> dict:
     params = {}
     if not qs: return params
@@ -218,11 +453,9 @@ def parse_query(qs: str) -> dict:
     return params
 
 # ---- Proxy HTTP GET (handles chunked) ----
-def http_get_json_via_proxy(pool, host, port, path):
-    s = pool.socket(pool.AF_INET, pool.SOCK_STREAM)
+async def http_get_json_via_proxy(pool, host, port, path):
+    up = open_conn(pool, host, port)
     try:
-        s.settimeout(5)
-        s.connect((host, port))
         # Build the HTTP request without f-strings
         req = (
             "GET " + path + " HTTP/1.1\r\n"
@@ -232,14 +465,14 @@ def http_get_json_via_proxy(pool, host, port, path):
             "Connection: close\r\n"
             "\r\n"
         ).encode("utf-8")
-        s.send(req)
+        await up.send_all(req)
 
         # Read entire response
         chunks = bytearray()
         buf = bytearray(2048)
         while True:
-            n = s.recv_into(buf)
-            if n <= 0:
+            n = await up.recv_into(buf)
+            if not n:
                 break
             chunks += buf[:n]
 
@@ -264,7 +497,7 @@ def http_get_json_via_proxy(pool, host, port, path):
 
         return status_code, body
     finally:
-        s.close()
+        up.close()
 
 def dechunk(data: bytes) -> bytes:
     """Dechunk HTTP/1.1 chunked body -> raw bytes."""
@@ -291,287 +524,216 @@ def dechunk(data: bytes) -> bytes:
         i += size + 2  # skip chunk + CRLF
     return bytes(out)
 
+# ---- Streaming proxy (constant memory) ----
+class Dechunker:
+    """Incremental chunked transfer-encoding decoder: feed() yields body slices."""
+    def __init__(self):
+        self.left = 0      # bytes left in the current chunk
+        self.skip = 0      # CRLF after a chunk still to skip
+        self.line = b""    # chunk-size line read so far
+        self.done = False
+
+    def feed(self, mv):
+        i, n = 0, len(mv)
+        while i < n and not self.done:
+            if self.left:
+                take = min(self.left, n - i)
+                yield mv[i:i + take]
+                i += take
+                self.left -= take
+                if not self.left:
+                    self.skip = 2
+            elif self.skip:
+                k = min(self.skip, n - i)
+                i += k
+                self.skip -= k
+            else:
+                start = i
+                while i < n and mv[i] != 10:  # "\n"
+                    i += 1
+                self.line += bytes(mv[start:i])
+                if len(self.line) > 64:
+                    raise ValueError("bad chunk size line")
+                if i == n:
+                    break  # the rest of the line is in the next read
+                i += 1
+                size = int(self.line.split(b";", 1)[0].strip(), 16)
+                self.line = b""
+                if size:
+                    self.left = size
+                else:
+                    self.done = True  # trailers, if any, are ignored
+
+proxy_buf = bytearray(PROXY_BUF)
+proxy_lock = asyncio.Lock()  # one stream at a time through proxy_buf
+
+async def proxy_stream(conn, host, port, path, ctype="application/json"):
+    """
+    Forward an upstream GET to the client while it arrives: the body passes
+    through proxy_buf (de-chunked on the fly), so peak memory doesn't depend
+    on the size of the response. Non-200 answers are passed on as
+    "<status> Upstream Error".
+    """
+    async with proxy_lock:
+        up = open_conn(pool, host, port)
+        try:
+            await up.send_all(
+                "GET " + path + " HTTP/1.1\r\n"
+                "Host: " + host + "\r\n"
+                "User-Agent: PicoW/1.0\r\n"
+                "Accept: application/json\r\n"
+                "Connection: close\r\n"
+                "\r\n"
+            )
+
+            # Response head (must fit in the buffer)
+            mv = memoryview(proxy_buf)
+            total, sep = 0, -1
+            while sep == -1:
+                if total == len(proxy_buf):
+                    raise ValueError("upstream headers too large")
+                n = await up.recv_into(mv[total:])
+                if not n:
+                    raise ValueError("bad upstream response")
+                total += n
+                sep = bytes(mv[:total]).find(b"\r\n\r\n")
+            head = bytes(mv[:sep]).decode("utf-8", "ignore").lower()
+            try:
+                status = int(head.split(" ", 2)[1])
+            except Exception:
+                raise ValueError("bad upstream status line")
+            chunked = "transfer-encoding: chunked" in head
+            length = None
+            for line in head.split("\r\n"):
+                if line.startswith("content-length:"):
+                    length = int(line[15:])
+
+            reason = "200 OK" if status == 200 else str(status) + " Upstream Error"
+            await conn.send_all(http_headers(reason, ctype, None if chunked else length))
+
+            # Body: what came with the head, then one buffer-full at a time
+            dec = Dechunker() if chunked else None
+            start = sep + 4
+            while True:
+                body = mv[start:total]
+                if dec:
+                    for part in dec.feed(body):
+                        await conn.send_all(part)
+                    if dec.done:
+                        break
+                elif len(body):
+                    await conn.send_all(body)
+                start, total = 0, await up.recv_into(mv)
+                if not total:
+                    break
+        finally:
+            up.close()
+
+# ---- Album search (shaped + cached) ----
+class SearchCache:
+    """
+    Query -> (albums, complete) for the last few queries, albums being
+    (id, name, artist, year, artwork_url) tuples. complete means OwnTone
+    returned every match, so any longer query containing this one can be
+    answered by filtering these albums locally.
+    """
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # query -> (expires, albums, complete)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query):
+        now = time.monotonic()
+        for q in list(self.entries):
+            if self.entries[q][0] <= now:
+                self.entries.pop(q)
+        e = self.entries.get(query)
+        if e is not None:
+            self.hits += 1
+            self.entries.pop(query)
+            self.entries[query] = e
+            return e[1]
+        for q, (expires, albums, complete) in self.entries.items():
+            if complete and q in query:
+                break
+        else:
+            self.misses += 1
+            return None
+        self.hits += 1
+        albums = [a for a in albums if query in a[1].lower() or query in a[2].lower()]
+        self.put(query, albums, True)
+        return albums
+
+    def put(self, query, albums, complete):
+        self.entries.pop(query, None)
+        while len(self.entries) >= self.size:
+            self.entries.pop(next(iter(self.entries)))
+        self.entries[query] = (time.monotonic() + self.ttl, albums, complete)
+
+search_cache = SearchCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
+async def search_albums(query):
+    """[(id, name, artist, year, artwork_url), ...] for a query, cached."""
+    key = query.lower()
+    albums = search_cache.get(key)
+    if albums is not None:
+        return albums
+    path = "/api/search?type=albums&limit=" + str(SEARCH_LIMIT) + "&query=" + url_encode(query)
+    status, body = await http_get_json_via_proxy(pool, MUSIC_HOST, MUSIC_PORT, path)
+    if status != 200:
+        raise OSError("search failed: HTTP " + str(status))
+    found = json.loads(body.decode("utf-8")).get("albums") or {}
+    items = found.get("items") or []
+    albums = [(str(a.get("id", "")), a.get("name") or "", a.get("artist") or "",
+               a.get("year") or 0, a.get("artwork_url") or "") for a in items]
+    search_cache.put(key, albums, found.get("total", len(items)) <= len(items))
+    return albums
+
+def albums_json(albums):
+    items = []
+    for album_id, name, artist, year, artwork_url in albums:
+        item = {"id": album_id, "name": name, "artist": artist}
+        if year:
+            item["year"] = year
+        if artwork_url:
+            item["artwork_url"] = artwork_url
+        items.append(item)
+    return json.dumps({"albums": {"items": items, "total": len(items)}})
+
 # ---- Serve HTML UI ----
-INDEX_HTML = """<!doctype html>
-<html lang="en">
-<head>
-<meta charset="utf-8">
-<title>Pico W – NFC → Redis Mapper</title>
-<meta name="viewport" content="width=device-width, initial-scale=1">
-<style>
-:root { font-family: system-ui, -apple-system, Segoe UI, Roboto, sans-serif; }
-body { margin:0; padding:1rem; background:#0b1220; color:#e6e9ef; }
-h1 { margin:0 0 1rem; font-size:1.25rem; }
-.card { background:#131a2a; border:1px solid #263149; border-radius:12px; padding:1rem; }
-.grid { display:grid; gap:.75rem; }
-.row { display:grid; grid-template-columns:140px 1fr; align-items:center; gap:.5rem; }
-input[type="text"]{ width:100%; padding:.6rem .7rem; background:#0f1524; color:#e6e9ef; border:1px solid #2a3550; border-radius:10px; }
-input[readonly]{ opacity:.9; }
-button{ padding:.6rem .9rem; border:1px solid #3a4c78; background:#1a2440; color:#e6e9ef; border-radius:10px; cursor:pointer; }
-button:hover{ background:#223057; }
-.actions{ display:flex; gap:.5rem; flex-wrap:wrap; }
-.results{ display:grid; grid-template-columns:repeat(auto-fill,minmax(220px,1fr)); gap:.75rem; }
-.item{ display:grid; grid-template-columns:64px 1fr; gap:.6rem; padding:.6rem; border:1px solid #263149; border-radius:10px; background:#0f1524; cursor:pointer; }
-.item:hover{ border-color:#3a4c78; background:#142045; }
-.item.selected{ outline:2px solid #5aa0ff; }
-.cover{ width:64px; height:64px; background:#1b2134; border-radius:8px; object-fit:cover; }
-.meta{ display:grid; gap:.2rem; }
-.title{ font-weight:600; }
-.artist,.subtle{ color:#a9b3c9; font-size:.9rem; }
-.status{ min-height:1.2rem; color:#9fd68f; }
-.error{ color:#ff9797; }
-.muted{ color:#a9b3c9; font-size:.9rem; }
-.footer{ margin-top:1rem; color:#93a1ba; font-size:.85rem; }
-.two-col{ display:grid; grid-template-columns:1fr 1fr; gap:.75rem; }
-@media (max-width:720px){ .row{ grid-template-columns:1fr; } .two-col{ grid-template-columns:1fr; } }
-</style>
-</head>
-<body>
-<h1>Pico W – Map NFC Card → Album URI</h1>
-
-<div class="grid">
-  <div class="card grid">
-    <div class="row">
-      <label for="searchInput">Search</label>
-      <div class="actions">
-        <input id="searchInput" type="text" placeholder="e.g., Black Holes and Revelations" />
-        <button id="searchBtn">Search</button>
-      </div>
-    </div>
-
-    <div class="muted">Results (albums)</div>
-    <div id="results" class="results"></div>
-    <div id="searchStatus" class="status"></div>
-  </div>
-
-  <div class="two-col">
-    <div class="card grid">
-      <div class="row">
-        <label for="nfcField">NFC Card</label>
-        <div class="actions">
-            <input id="nfcField" type="text" readonly placeholder="Waiting for card…" />
-            <button id="refreshNfcBtn" title="Poll /nfc">Refresh NFC</button>
-            <button id="checkBtn" title="Lookup current mapping">Check</button>
-            <label style="display:inline-flex;align-items:center;gap:.35rem;margin-left:.5rem;">
-              <input id="liveNfcChk" type="checkbox"> Live NFC
-            </label>
-        </div>
-      </div>
-      <div class="muted">Pico exposes <code>/nfc</code> returning <code>{"uid":"43A2EB33"}</code>.</div>
-    </div>
-
-    <div class="card grid">
-      <div class="row">
-        <label for="uriField">Selected URI</label>
-        <input id="uriField" type="text" readonly placeholder="Click a result to fill this" />
-      </div>
-      <div class="actions">
-        <button id="saveBtn">Save to Redis</button>
-        <div id="saveStatus" class="status"></div>
-      </div>
-      <div class="muted">Saves as <code>&lt;NFC UID&gt; : &lt;URI&gt;</code> via <code>/set?key=&amp;value=</code>.</div>
-    </div>
-  </div>
-
-  <div class="card footer">
-    <div><b>Note</b>: This page calls <code>/search</code> on the Pico, which proxies to <code>http://music.local/api/search</code>.</div>
-  </div>
-</div>
-
-<script>
-const PICO_BASE = '';
-const searchInput   = document.getElementById('searchInput');
-const searchBtn     = document.getElementById('searchBtn');
-const resultsEl     = document.getElementById('results');
-const searchStatus  = document.getElementById('searchStatus');
-const nfcField      = document.getElementById('nfcField');
-const refreshNfcBtn = document.getElementById('refreshNfcBtn');
-const uriField      = document.getElementById('uriField');
-const saveBtn       = document.getElementById('saveBtn');
-const saveStatus    = document.getElementById('saveStatus');
-const checkBtn = document.getElementById('checkBtn');
-
-let selectedItemEl = null;
-
-function escapeHtml(s){ return s.replace(/[&<>"]/g, c => ({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;'}[c])); }
-function toAlbumURI(item){ return (item.uri && item.uri.startsWith('library:')) ? item.uri : ('library:album:' + item.id); }
-function albumArtworkUrl(item){ try { return new URL(item.artwork_url, 'http://localhost').toString(); } catch { return ''; } }
-
-function clearResults(){
-  resultsEl.innerHTML = '';
-  uriField.value = '';
-  if (selectedItemEl) selectedItemEl.classList.remove('selected');
-  selectedItemEl = null;
-}
-
-async function doSearch(){
-  clearResults();
-  const q = (searchInput.value || '').trim();
-  if (!q){ searchStatus.textContent = 'Enter something to search.'; return; }
-  searchStatus.textContent = 'Searching…';
-  try{
-    const url = `${PICO_BASE}/api/search?type=${encodeURIComponent('tracks,artists,albums,playlists')}&query=${encodeURIComponent(q)}`;
-    const resp = await fetch(url, {method:'GET'});
-    if (!resp.ok) throw new Error('HTTP ' + resp.status);
-    const data = await resp.json();
-    const albums = (data && data.albums && Array.isArray(data.albums.items)) ? data.albums.items : [];
-    if (!albums.length){ searchStatus.textContent = 'No albums found.'; return; }
-    for (const item of albums){
-      const el = document.createElement('div');
-      el.className = 'item';
-      el.innerHTML = `
-        <img class="cover" src="${escapeHtml(albumArtworkUrl(item))}" onerror="this.style.visibility='hidden'">
-        <div class="meta">
-          <div class="title">${escapeHtml(item.name || '(unknown)')}</div>
-          <div class="artist">${escapeHtml(item.artist || '')}</div>
-          <div class="subtle">${item.year ? escapeHtml(String(item.year)) : ''}</div>
-        </div>`;
-      el.addEventListener('click', () => {
-        if (selectedItemEl) selectedItemEl.classList.remove('selected');
-        el.classList.add('selected'); selectedItemEl = el;
-        uriField.value = toAlbumURI(item);
-      });
-      resultsEl.appendChild(el);
-    }
-    searchStatus.textContent = `Found ${albums.length} album${albums.length>1?'s':''}.`;
-  }catch(err){
-    searchStatus.innerHTML = `<span class="error">Search failed: ${escapeHtml(err.message)}</span>`;
-  }
-}
-
-async function checkCard(){
-  const uid = (nfcField.value || '').trim();
-  if (!uid){ saveStatus.innerHTML = '<span class="error">No NFC UID.</span>'; return; }
-  try{
-    const r = await fetch(`${PICO_BASE}/lookup?key=${encodeURIComponent(uid)}`);
-    if (!r.ok){ throw new Error('HTTP ' + r.status); }
-    const j = await r.json();
-    if (j.found){
-      const human = j.title || j.value || '(unknown)';
-      saveStatus.textContent = `Card ${uid} is assigned to: ${human}`;
-    } else {
-      saveStatus.textContent = `Card ${uid} is not assigned yet.`;
-    }
-  }catch(err){
-    saveStatus.innerHTML = `<span class="error">Lookup failed: ${String(err.message || err)}</span>`;
-  }
-}
-
-async function pollNfcOnce(){
-  try{ const r = await fetch(`${PICO_BASE}/nfc`, {cache:'no-store'});
-       if (!r.ok) return;
-       const j = await r.json();
-       if (j && j.uid) nfcField.value = j.uid; }catch{}
-}
-
-checkBtn.addEventListener('click', checkCard);
-searchBtn.addEventListener('click', doSearch);
-searchInput.addEventListener('keydown', e => { if (e.key === 'Enter') doSearch(); });
-refreshNfcBtn.addEventListener('click', pollNfcOnce);
-
-async function saveMapping(){
-  saveStatus.textContent = '';
-  const uid = (nfcField.value || '').trim();
-  const uri = (uriField.value || '').trim();
-  if (!uid){ saveStatus.innerHTML = '<span class="error">No NFC UID.</span>'; return; }
-  if (!uri){ saveStatus.innerHTML = '<span class="error">No URI selected.</span>'; return; }
-
-  // Preflight: if this card already has EXACTLY this URI, skip saving
-  try {
-    const check = await fetch(`${PICO_BASE}/lookup?key=${encodeURIComponent(uid)}`);
-    if (check.ok) {
-      const j = await check.json();
-      if (j && j.found && j.value === uri) {
-        const shown = j.title || j.value || '(current)';
-        saveStatus.textContent = `No change — card ${uid} already mapped to: ${shown}`;
-        return;
-      }
-    }
-  } catch(_) { /* ignore and fall through */ }
-
-  async function doSet(force){
-    const url = `${PICO_BASE}/set?key=${encodeURIComponent(uid)}&value=${encodeURIComponent(uri)}${force?'&force=1':''}`;
-    const r = await fetch(url, { method: 'GET' });
-    const text = await r.text();
-    let j = null; try { j = JSON.parse(text); } catch {}
-    return { r, ok: r.ok, status: r.status, text, j };
-  }
-
-  try {
-    let { r, ok, status, text, j } = await doSet(false);
-    if (ok){
-      if (j && j.unchanged) {
-        // Server confirmed idempotent save
-        const shown = uri; // optional: keep simple; you could reuse the preflight title
-        saveStatus.textContent = `No change — card ${uid} already mapped to: ${shown}`;
-      } else {
-        saveStatus.textContent = `Saved: ${uid} → ${uri}`;
-      }
-      return;
-    }
-
-    // ---- 409 handling (unchanged from your last version) ----
-    if (status === 409) {
-      let info = null;
-      try { info = JSON.parse(text); } catch {}
-
-      if (info && info.error === 'uri_in_use') {
-        const who = info.by || '(another card)';
-        const title = info.by_title ? ` (${info.by_title})` : '';
-        saveStatus.innerHTML = `<span class="error">That album is already assigned to card ${who}${title}. Choose a different album.</span>`;
-        return;
-      }
-
-      const human = info && (info.current_title ||
-                    ((info.current_artist && info.current_name)
-                       ? (info.current_artist + ' - ' + info.current_name)
-                       : ''));
-      const fallback = info && info.current ? info.current : '(unknown)';
-      const shown = human || fallback;
-
-      const msg = `This card is already assigned to:\n${shown}\n\nOverwrite with:\n${uri}?`;
-      if (confirm(msg)) {
-        ({ r, ok, status, text, j } = await doSet(true));
-        if (ok){ saveStatus.textContent = `Overwritten: ${uid} → ${uri}`; return; }
-        throw new Error(text || ('HTTP ' + status));
-      } else {
-        saveStatus.innerHTML = `<span class="error">Not saved — card already assigned to ${shown}.</span>`;
-        return;
-      }
-    }
-    // ---------------------------------------------------------
-
-    // Any other non-OK
-    throw new Error(text || ('HTTP ' + status));
-  } catch (err) {
-    saveStatus.innerHTML = `<span class="error">Save failed: ${String(err.message || err)}</span>`;
-  }
-}
-
-const liveNfcChk = document.getElementById('liveNfcChk');
-let nfcTimer = null;
-
-function setLiveNfc(on) {
-  if (on && !document.hidden) {
-    if (!nfcTimer) nfcTimer = setInterval(pollNfcOnce, 1500); // gentle 1.5s polling
-  } else {
-    if (nfcTimer) { clearInterval(nfcTimer); nfcTimer = null; }
-  }
-}
-liveNfcChk.addEventListener('change', () => setLiveNfc(liveNfcChk.checked));
-
-// Pause polling when the tab isn’t visible
-document.addEventListener('visibilitychange', () => {
-  setLiveNfc(liveNfcChk.checked && !document.hidden);
-});
-
-saveBtn.addEventListener('click', saveMapping);
-
-// initial NFC fetch
-pollNfcOnce();
-</script>
-</body></html>
-"""
+# www/index.html, gzipped by build-ui.py and streamed from flash as-is.
+# The sidecar .etag file holds a hash of the .gz; browsers revalidate on
+# every visit (no-cache) and get a 304 until the file changes.
+UI_FILE = "/www/index.html.gz"
+UI_CHUNK = 1024
+
+try:
+    UI_SIZE = os.stat(UI_FILE)[6]
+    with open(UI_FILE + ".etag") as f:
+        UI_ETAG = '"' + f.read().strip() + '"'
+except OSError:
+    UI_SIZE, UI_ETAG = 0, None
+    print("No " + UI_FILE + " (run build-ui.py and copy www/ to CIRCUITPY)")
+
+async def send_ui(conn, req_text):
+    if UI_ETAG is None:
+        await http_send(conn, "503 Service Unavailable", "UI not installed: copy www/ to CIRCUITPY"); return
+    cache = "ETag: " + UI_ETAG + "\r\nCache-Control: no-cache\r\n"
+    if UI_ETAG in request_header(req_text, "if-none-match"):
+        await conn.send_all("HTTP/1.1 304 Not Modified\r\n" + cache + "Connection: close\r\n\r\n")
+        return
+    await conn.send_all(http_headers("200 OK", "text/html; charset=utf-8", UI_SIZE,
+                                     "Content-Encoding: gzip\r\n" + cache))
+    chunk = bytearray(UI_CHUNK)
+    mv = memoryview(chunk)
+    with open(UI_FILE, "rb") as f:
+        while True:
+            n = f.readinto(chunk)
+            if not n:
+                break
+            await conn.send_all(mv[:n])
 
 def open_server(cur_pool, port=80, attempts=18, delay=0.5):
     """
@@ -587,9 +749,9 @@ def open_server(cur_pool, port=80, attempts=18, delay=0.5):
         s = None
         try:
             s = pool_ref.socket(pool_ref.AF_INET, pool_ref.SOCK_STREAM)
-            s.settimeout(0.1)  # short accept timeout so main loop can do other work
+            s.settimeout(0)  # non-blocking accept; serve() polls it between other tasks
             s.bind(("0.0.0.0", port))
-            s.listen(2)
+            s.listen(MAX_CONNECTIONS)
             return s, pool_ref
         except OSError as e:
             last_err = e
@@ -664,17 +826,17 @@ PORT = 80  # keep using 80
 time.sleep(0.25)
 srv, pool = open_server(pool, port=PORT)  # <-- unpack tuple
 print("HTTP server: http://%s%s" % (wifi.radio.ipv4_address, "" if PORT == 80 else (":" + str(PORT))))
-buf = bytearray(4096)
+redis = RedisClient(pool, REDIS_HOST, REDIS_PORT, REDIS_PASSWORD)
 
-def handle_request(conn, req_text):
+async def handle_request(conn, req_text):
     # Parse first line
     line = req_text.split("\r\n", 1)[0]
     parts = line.split(" ")
     if len(parts) < 2:
-        http_send(conn, "400 Bad Request", "Bad request"); return
+        await http_send(conn, "400 Bad Request", "Bad request"); return
     method, path = parts[0], parts[1]
     if method != "GET":
-        http_send(conn, "405 Method Not Allowed", "Use GET"); return
+        await http_send(conn, "405 Method Not Allowed", "Use GET"); return
 
     # route + params
     if "?" in path:
@@ -684,26 +846,26 @@ def handle_request(conn, req_text):
         route, params = path, {}
 
     if route == "/":
-        http_send(conn, "200 OK", INDEX_HTML, "text/html")
+        await send_ui(conn, req_text)
     elif route == "/nfc":
-        # Try a fresh read right now
-        poll_nfc_once()
+        # nfc_task keeps this current
         body = json.dumps({"uid": last_uid or ""})
-        http_send(conn, "200 OK", body, "application/json")
+        await http_send(conn, "200 OK", body, "application/json")
     elif route == "/set":
         key = params.get("key"); val = params.get("value")
         force = params.get("force", "")
         if not key or val is None:
-            http_send(conn, "400 Bad Request", "Provide key and value"); return
+            await http_send(conn, "400 Bad Request", "Provide key and value"); return
         try:
-            # Reverse-lookup protection: prevent the same album URI being assigned to another UID
-            idx_owner = redis_get_str("uri:" + val)
+            # Reverse-lookup protection: prevent the same album URI being assigned to another UID.
+            # Both reads go out in one pipelined write.
+            idx_owner, cur_val = await redis.pipeline(("GET", "uri:" + val), ("GET", key))
             if idx_owner and idx_owner != key:
                 # Enrich with album title from the *target* URI if possible
                 by_title = ""
                 if val.startswith("library:album:"):
                     album_id2 = val.split(":")[-1]
-                    meta2 = fetch_album(pool, album_id2)
+                    meta2 = await fetch_album(pool, album_id2)
                     if meta2:
                         a2 = meta2.get("artist", "")
                         n2 = meta2.get("name", "")
@@ -712,28 +874,30 @@ def handle_request(conn, req_text):
                 body = {"error":"uri_in_use", "uri": val, "by": idx_owner}
                 if by_title:
                     body["by_title"] = by_title
-                http_send(conn, "409 Conflict", json.dumps(body), "application/json")
+                await http_send(conn, "409 Conflict", json.dumps(body), "application/json")
                 return
 
             if force in ("1","true","yes","True"):
                 # Allow overwriting this UID's own value, while keeping URI uniqueness.
-                old_val = redis_get_str(key)
                 # (Index uniqueness already checked above)
-                _ = redis_cmd(pool, b"SET", key, val)  # overwrite
-                _ = redis_cmd(pool, b"SET", "uri:" + val, key)  # ensure index points to this UID
-                if old_val and old_val != val:
-                    _ = redis_cmd(pool, b"DEL", "uri:" + old_val)  # clean old index
-                http_send(conn, "200 OK", "OK", "text/plain")
+                cmds = [("SET", key, val),             # overwrite
+                        ("SET", "uri:" + val, key)]    # ensure index points to this UID
+                if cur_val and cur_val != val:
+                    cmds.append(("DEL", "uri:" + cur_val))  # clean old index
+                await redis.pipeline(*cmds)
+                await http_send(conn, "200 OK", "OK", "text/plain")
             else:
                 # Only set if this card UID doesn't already have a value
-                raw = redis_cmd(pool, b"SET", key, val, "NX")
-                msg = parse_redis_simple(raw)
+                msg = None
+                if cur_val is None:
+                    msg = await redis.command("SET", key, val, "NX")
+                    if msg is None:
+                        cur_val = await redis_get_str(key)  # another save won the race
                 if msg is None:
-                    # Key already exists → get current and handle idempotency
-                    cur_val = redis_get_str(key)
+                    # Key already exists → handle idempotency
                     if cur_val == val:
                         # Idempotent save: same value already set for this UID
-                        http_send(conn, "200 OK", json.dumps({"ok": True, "unchanged": True}), "application/json")
+                        await http_send(conn, "200 OK", json.dumps({"ok": True, "unchanged": True}), "application/json")
                         return
 
 
@@ -744,7 +908,7 @@ def handle_request(conn, req_text):
                     album_id = None
                     if cur_val and cur_val.startswith("library:album:"):
                         album_id = cur_val.split(":")[-1]
-                        meta = fetch_album(pool, album_id)
+                        meta = await fetch_album(pool, album_id)
                         if meta:
                             artist = meta.get("artist", "")
                             name = meta.get("name", "")
@@ -757,32 +921,32 @@ def handle_request(conn, req_text):
                         resp_obj["current_artist"] = artist or ""
                         resp_obj["current_name"] = name or ""
                         resp_obj["album_id"] = album_id or ""
-                    http_send(conn, "409 Conflict", json.dumps(resp_obj), "application/json")
+                    await http_send(conn, "409 Conflict", json.dumps(resp_obj), "application/json")
                 else:
                     # New assignment → write reverse index now
-                    _ = redis_cmd(pool, b"SET", "uri:" + val, key)
-                    http_send(conn, "200 OK", msg, "text/plain")
+                    await redis.command("SET", "uri:" + val, key)
+                    await http_send(conn, "200 OK", msg, "text/plain")
         except Exception as e:
-            http_send(conn, "502 Bad Gateway", "Redis error: " + repr(e))
+            await http_send(conn, "502 Bad Gateway", "Redis error: " + repr(e))
     elif route == "/get":
         key = params.get("key")
         if not key:
-            http_send(conn, "400 Bad Request", "Provide key"); return
+            await http_send(conn, "400 Bad Request", "Provide key"); return
         try:
-            raw = redis_cmd(pool, b"GET", key)
-            http_send(conn, "200 OK", raw.decode("utf-8","ignore"))
+            val = await redis.command("GET", key)
+            await http_send(conn, "200 OK", "(nil)" if val is None else str(val))
         except Exception as e:
-            http_send(conn, "502 Bad Gateway", "Redis error: " + repr(e))
+            await http_send(conn, "502 Bad Gateway", "Redis error: " + repr(e))
     elif route == "/lookup":
         lookup_key = params.get("key", "")
         if not lookup_key:
-            http_send(conn, "400 Bad Request", json.dumps({"error":"missing key"}), "application/json"); return
+            await http_send(conn, "400 Bad Request", json.dumps({"error":"missing key"}), "application/json"); return
         try:
-            cur_val = redis_get_str(lookup_key)
+            cur_val = await redis_get_str(lookup_key)
             resp = {"key": lookup_key, "found": bool(cur_val), "value": cur_val or ""}
             if cur_val and cur_val.startswith("library:album:"):
                 album_id = cur_val.split(":")[-1]
-                meta = fetch_album(pool, album_id)
+                meta = await fetch_album(pool, album_id)
                 if meta:
                     artist = meta.get("artist", "")
                     name = meta.get("name", "")
@@ -793,66 +957,81 @@ def handle_request(conn, req_text):
                     resp["title"] = title
                     if "artwork_url" in meta:
                         resp["artwork_url"] = meta.get("artwork_url")
-            http_send(conn, "200 OK", json.dumps(resp), "application/json")
+            await http_send(conn, "200 OK", json.dumps(resp), "application/json")
+        except Exception as e:
+            await http_send(conn, "502 Bad Gateway", json.dumps({"error": "lookup_failed", "detail": repr(e)}), "application/json")
+    elif route == "/albums":
+        q = params.get("query", "").strip()
+        try:
+            albums = (await search_albums(q)) if q else []
+            await http_send(conn, "200 OK", albums_json(albums), "application/json")
         except Exception as e:
-            http_send(conn, "502 Bad Gateway", json.dumps({"error": "lookup_failed", "detail": repr(e)}), "application/json")
+            await http_send(conn, "502 Bad Gateway", json.dumps({"error": repr(e)}), "application/json")
     elif route == "/search" or route == "/api/search":
+        # Raw OwnTone results, streamed
         q = params.get("query", "")
         t = params.get("type", "tracks,artists,albums,playlists")
-        upstream_path = "/api/search?type=" + t + "&query=" + q
+        upstream_path = "/api/search?type=" + url_encode(t) + "&query=" + url_encode(q)
         try:
-            status, body = http_get_json_via_proxy(pool, MUSIC_HOST, MUSIC_PORT, upstream_path)
-            ctype = "application/json"
-            if status == 200:
-                http_send(conn, "200 OK", body, ctype)
-            else:
-                http_send(conn, str(status) + " Upstream Error", body, ctype)
+            await proxy_stream(conn, MUSIC_HOST, MUSIC_PORT, upstream_path)
         except Exception as e:
-            http_send(conn, "502 Bad Gateway", json.dumps({"error": repr(e)}), "application/json")
+            if conn.sent:
+                return  # already streaming; the client sees a short body
+            await http_send(conn, "502 Bad Gateway", json.dumps({"error": repr(e)}), "application/json")
     elif route == "/health":
-        http_send(conn, "200 OK", "OK", "text/plain")
+        c = album_cache
+        body = "OK\nalbum_cache hits=%d misses=%d entries=%d bytes=%d/%d\n" % (
+            c.hits, c.misses, len(c.entries), c.bytes, c.max_bytes)
+        body += "search_cache hits=%d misses=%d entries=%d\n" % (
+            search_cache.hits, search_cache.misses, len(search_cache.entries))
+        await http_send(conn, "200 OK", body, "text/plain")
     elif route == "/favicon.ico":
-        http_send(conn, "204 No Content", b"", "image/x-icon")
+        await http_send(conn, "204 No Content", b"", "image/x-icon")
     else:
-        http_send(conn, "404 Not Found", "Not found")
+        await http_send(conn, "404 Not Found", "Not found")
 
 # ---- Main loop ----
-try:
-    while True:
-        # Background task: poll NFC even when idle
-        poll_nfc_once()
-
-        # Non-blocking-ish accept (srv has a short timeout)
-        try:
-            client, addr = srv.accept()
-        except Exception:
-            continue
+connections = 0
 
+async def handle_conn(sock):
+    global connections
+    connections += 1
+    conn = Conn(sock)
+    try:
+        # Read request safely (the deadline covers the whole exchange)
+        req_text = await read_http_request(conn, bytearray(REQUEST_BUF))
+        if not req_text:
+            return  # nothing useful; just close
         try:
-            # Read request safely (don’t hang forever)
-            req_text = read_http_request(client, buf, timeout_s=3.0)
-            if not req_text:
-                # Nothing useful; close and continue
-                try:
-                    client.close()
-                except Exception:
-                    pass
-                continue
-
-            # Handle one request
-            handle_request(client, req_text)
-
+            await handle_request(conn, req_text)
         except Exception as e:
             # Best-effort error back to client
+            await http_send(conn, "500 Internal Server Error", "Error: " + repr(e), "text/plain")
+    except Exception:
+        pass  # client went away or ran out of time
+    finally:
+        conn.close()
+        connections -= 1
+
+async def serve(srv):
+    while True:
+        if connections < MAX_CONNECTIONS:
             try:
-                http_send(client, "500 Internal Server Error", "Error: " + repr(e), "text/plain")
-            except Exception:
-                pass
-        finally:
-            try:
-                client.close()
-            except Exception:
-                pass
+                client, addr = srv.accept()
+            except OSError as e:
+                if e.errno not in _WOULD_BLOCK:
+                    print("accept failed:", repr(e))
+            else:
+                asyncio.create_task(handle_conn(client))
+                continue  # there may be more waiting
+        await asyncio.sleep(0.01)
+
+async def main():
+    asyncio.create_task(nfc_task())
+    await serve(srv)
+
+try:
+    asyncio.run(main())
 except Exception as e:
     print("Fatal:", repr(e))
 finally:
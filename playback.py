@@ -1,12 +1,15 @@
-import board
 import media
 import library
-import busio
+import album_cache
+import prefetch
+import player_state
+import metrics
+import resilience
+import sys
 import syslog
-from time import sleep
-from digitalio import DigitalInOut, Pull
-from traceback import print_exc, format_exc
-from watch_reload import start_watch
+import threading
+from time import monotonic
+from traceback import format_exc
 
 #PIN_SWITCH_MUTE = board.D5
 #PIN_SWITCH_MODE = board.D6
@@ -18,10 +21,22 @@ CLK_PIN = 17  # Pin 11 - Clock
 DT_PIN  = 27  # Pin 13 - Data
 SW_PIN  = 22  # Pin 15 - Switch/Button (to GND, PUD_UP)
 
+# Lifting a card pauses instead of stopping; putting the same card back
+# within this many minutes resumes in place without rebuilding the queue.
+# 0 goes back to stop-on-remove.
+RESUME_MINUTES = 10
+
+# What was playing when the last card was lifted
+resume_point = {"uid": None, "item_id": None, "position_ms": 0, "removed_at": None}
+current_uid = None
+
 def error():
-    exc = format_exc()
-    print(exc)
-    sleep(1)
+    _running.failed = True
+    if isinstance(sys.exc_info()[1], resilience.CircuitOpen):
+        # owntone is down or restarting; media.breaker already said so
+        print(f"[playback] skipped: {sys.exc_info()[1]}")
+        return
+    print(format_exc())
 
 def outputs_volume(outputs: list[str], volume: int):
     try:
@@ -30,7 +45,48 @@ def outputs_volume(outputs: list[str], volume: int):
     except:
         error()
 
+def current_player():
+    state = player_state.state
+    if state.connected and state.player:
+        return state.player
+    return media.player()
+
+def resume(id) -> bool:
+    """Pick up where `id` left off if it is the card that was just lifted."""
+    point = resume_point
+    if not RESUME_MINUTES or point["uid"] != id or point["removed_at"] is None:
+        return False
+    if monotonic() - point["removed_at"] > RESUME_MINUTES * 60:
+        return False
+
+    player = current_player()
+    if player.get("item_id") == point["item_id"] and player.get("state") == "pause":
+        print(f"resume {id}")
+        media.play()
+    else:
+        # Stopped (or moved on) in the meantime; jump back to the saved item
+        try:
+            media.play(point["item_id"])
+        except Exception:
+            return False  # item no longer in the queue
+        if point["position_ms"]:
+            media.seek(point["position_ms"])
+        print(f"resume {id} at item {point['item_id']} {point['position_ms']}ms")
+    player_state.state.update_player(state="play")
+    return True
+
+def start_queue(args):
+    """Replace the queue with `args` and start it with repeat/shuffle already set."""
+    batch = media.batch()
+    # repeat survives a queue replace; only send it when owntone isn't already there
+    state = player_state.state
+    if not (state.connected and state.player.get("repeat") == "all"):
+        batch.repeat("all")
+    batch.add(**args).commit()
+    state.update_player(state="play", repeat="all", shuffle=args.get("shuffle") == "true")
+
 def queue(id):
+    global current_uid
     data: dict[str, str] = library.playlists.get(id)
     if not data:
         print(f"no data for {id}, add new tag to library")
@@ -38,16 +94,117 @@ def queue(id):
         return
 
     try:
-        media.queue(data)
-        media.repeat("all")
+        resumed = resume(id)
+        resume_point["removed_at"] = None
+        current_uid = id
+        if resumed:
+            prefetch.on_tap(id)
+            return
+        args = album_cache.payload(data)
+        if superseded():
+            print(f"queue {id} superseded")
+            return
+        try:
+            start_queue(args)
+        except Exception:
+            if args is data:
+                raise
+            # cached track ids went stale before owntone's database event reached us
+            album_cache.request_refresh()
+            start_queue(data)
+        prefetch.on_tap(id)
     except:
         error()
         return
 
-    sleep(1)
+
+actions_total = metrics.counter("playback_actions_total", "Playback worker actions by outcome", ("result",))
+_done = actions_total.labels("done")
+_failed = actions_total.labels("failed")
+_superseded = actions_total.labels("superseded")
+
+
+class PlaybackWorker:
+    """
+    Runs playback actions on their own thread so the NFC thread never waits
+    on owntone. Only the newest request is kept: a tap submitted while an
+    older queue is still running supersedes it, a pending action that never
+    started is dropped, and a running one bails out at its next step.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.pending = None
+        self.generation = 0
+        self.superseded_count = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        metrics.watch_thread("playback", self.thread)
+
+    def submit(self, action, *args):
+        with self.cond:
+            self.generation += 1
+            if self.pending is not None:
+                self.superseded_count += 1
+                _superseded.inc()
+            self.pending = (self.generation, action, args)
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.pending is None:
+                    self.cond.wait()
+                generation, action, args = self.pending
+                self.pending = None
+            execute(generation, action, args)
+
+
+_worker = None
+_running = threading.local()
+
+
+def execute(generation: int, action, args) -> bool:
+    """
+    Run one worker action; superseded() inside it is checked against
+    `generation`. False if it failed (actions report errors via error()).
+    """
+    _running.generation = generation
+    _running.failed = False
+    try:
+        action(*args)
+    except:
+        error()
+    metrics.heartbeat("playback")
+    if _running.failed:
+        _failed.inc()
+        return False
+    _done.inc()
+    return True
+
+
+def worker() -> PlaybackWorker:
+    global _worker
+    if _worker is None:
+        _worker = PlaybackWorker()
+    return _worker
+
+
+def use_worker(w):
+    """Send worker().submit() to another implementation, e.g. the runtime's playback task."""
+    global _worker
+    _worker = w
+
+
+def superseded() -> bool:
+    """True inside a worker action once a newer action has been submitted."""
+    generation = getattr(_running, "generation", None)
+    return generation is not None and generation != _worker.generation
 
 
 def stop():
+    if RESUME_MINUTES and current_uid:
+        return pause_for_resume()
 
     print("stop")
     try:
@@ -56,13 +213,42 @@ def stop():
         error()
         return
 
-def pause():
-    print("toogle")
+def pause_for_resume():
+    global current_uid
+    print("pause (resumable)")
     try:
-        playing = media.player()["state"] == "play"
+        media.pause()
     except:
         error()
         return
+    try:
+        # read the position live, after pausing: the websocket mirror is only
+        # refreshed on play/pause/seek, so its item_progress_ms is stale
+        player = media.player()
+    except Exception as e:
+        # the pause went through; fall back to the mirror rather than failing the action
+        print(f"[playback] live position unavailable ({e}), using the last known one")
+        player = player_state.state.player or {}
+    resume_point.update(
+        uid=current_uid,
+        item_id=player.get("item_id"),
+        position_ms=player.get("item_progress_ms", 0),
+        removed_at=monotonic(),
+    )
+    current_uid = None
+    player_state.state.update_player(state="pause")
+
+def pause():
+    print("toogle")
+    state = player_state.state
+    if state.connected:
+        playing = state.is_playing()
+    else:
+        try:
+            playing = media.player()["state"] == "play"
+        except:
+            error()
+            return
 
     if playing:
         print("pause")
@@ -71,6 +257,7 @@ def pause():
         except:
             error()
             return
+        state.update_player(state="pause")
     else:
         print("resume")
         try:
@@ -78,6 +265,7 @@ def pause():
         except:
             error()
             return
+        state.update_player(state="play")
 
 
 def next():
@@ -104,13 +292,10 @@ def previous():
 def init():
     print("waiting for media server")
 
-    while True:
-        sleep(0.5)
-        try:
-            if media.library()["updating"] == False:
-                print("library updated")
-                break
-        except:
-            pass
+    # The subscriber sets library_ready once owntone answers and is no longer
+    # scanning, so there is nothing to poll here.
+    player_state.start()
+    player_state.state.library_ready.wait()
+    print("library updated")
 
     print("media server ready")
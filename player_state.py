@@ -0,0 +1,238 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import struct
+import threading
+from traceback import format_exc
+from media_async import AsyncOwnToneClient
+import media
+import metrics
+
+# In-memory mirror of owntone's player, queue, output and library state,
+# kept fresh by owntone's websocket notification channel
+# https://owntone.github.io/owntone-server/json-api/#push-notifications
+#
+# Readers (playback.pause, playback.init, ...) look at `state` and never
+# block on HTTP. While the websocket is down `state.connected` is False and
+# callers should fall back to asking media.py directly.
+
+EVENTS = ["player", "queue", "volume", "outputs", "database", "update"]
+
+## owntone's default; overridden by websocket_port from /api/config
+websocket_port = 3688
+
+## seconds between refreshes when owntone has its websocket disabled
+poll_interval = 5.0
+
+_WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class PlayerState:
+    def __init__(self):
+        self.connected = False
+        self.player = {}
+        self.queue = {}
+        self.outputs = []
+        self.library = {}
+        self.library_ready = threading.Event()
+        self.listeners = []
+
+    def is_playing(self):
+        return self.player.get("state") == "play"
+
+    def update_player(self, **changes):
+        # Optimistic local update so a second button press before owntone's
+        # notification arrives still sees the state we just asked for.
+        self.player = {**self.player, **changes}
+
+    def on_change(self, callback):
+        """callback(events: set[str]) runs on the subscriber thread after a refresh."""
+        self.listeners.append(callback)
+
+    def _notify(self, events):
+        for callback in self.listeners:
+            try:
+                callback(events)
+            except Exception:
+                print(format_exc())
+
+
+state = PlayerState()
+
+
+class StateSubscriber:
+    def __init__(self, player_state: PlayerState = state, client: AsyncOwnToneClient = None):
+        self.state = player_state
+        self.client = client or AsyncOwnToneClient()
+        self.thread = None
+        self.loop = None
+        self.task = None
+
+    async def refresh(self, events):
+        s = self.state
+        if events & {"player", "volume"}:
+            s.player = await self.client.player()
+        if "queue" in events:
+            s.queue = await self.client.get_json("/api/queue?start=0&end=0")
+        if events & {"outputs", "volume"}:
+            s.outputs = (await self.client.outputs()).get("outputs", [])
+        if events & {"database", "update"}:
+            s.library = await self.client.library()
+            if s.library.get("updating") is False:
+                s.library_ready.set()
+            else:
+                s.library_ready.clear()
+        s._notify(events)
+
+    async def run(self):
+        backoff = 0.5
+        while True:
+            try:
+                await self.refresh(set(EVENTS))
+                port = (await self.client.get_json("/api/config")).get("websocket_port", websocket_port)
+                if not port:
+                    # websocket disabled in owntone.conf: keep the mirror warm by polling
+                    await asyncio.sleep(poll_interval)
+                    continue
+                reader, writer = await _ws_connect(self.client.host, port, "notify")
+                try:
+                    await _ws_send_text(writer, json.dumps({"notify": EVENTS}))
+                    # events may have fired between the refresh above and subscribing
+                    await self.refresh(set(EVENTS))
+                    self.state.connected = True
+                    backoff = 0.5
+                    print("owntone notifications connected")
+                    while True:
+                        message = json.loads(await _ws_recv(reader, writer))
+                        await self.refresh(set(message.get("notify", [])))
+                finally:
+                    self.state.connected = False
+                    writer.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"owntone notifications unavailable: {e!r}")
+            delay = backoff
+            if not media.available():
+                # while held taps wait for the breaker, this is the only caller left
+                # to probe it: try again as soon as it half-opens, not after a long backoff
+                delay = min(delay, media.breaker.retry_in() + 0.05)
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, 30)
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return self
+        self.thread = threading.Thread(target=self._thread_main, daemon=True)
+        self.thread.start()
+        metrics.watch_thread("state", self.thread)
+        metrics.gauge("owntone_notify_connected", "1 while the owntone websocket is up").set_fn(
+            lambda: 1 if self.state.connected else 0
+        )
+        return self
+
+    def _thread_main(self):
+        self.loop = asyncio.new_event_loop()
+        self.task = self.loop.create_task(self.run())
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.loop.run_until_complete(self.client.close())
+            self.loop.close()
+
+    def stop(self):
+        if self.loop and self.task:
+            self.loop.call_soon_threadsafe(self.task.cancel)
+        if self.thread:
+            self.thread.join()
+
+
+_subscriber = None
+
+
+def subscriber() -> StateSubscriber:
+    """The shared subscriber that feeds `state` (not started)."""
+    global _subscriber
+    if _subscriber is None:
+        _subscriber = StateSubscriber()
+    return _subscriber
+
+
+def start():
+    """Start the shared subscriber on its own thread and event loop."""
+    return subscriber().start()
+
+
+# ---- Minimal websocket client (RFC 6455), text frames only ----
+async def _ws_connect(host, port, protocol):
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16))
+    writer.write(
+        b"GET / HTTP/1.1\r\n"
+        b"Host: %s:%d\r\n"
+        b"Upgrade: websocket\r\n"
+        b"Connection: Upgrade\r\n"
+        b"Sec-WebSocket-Key: %s\r\n"
+        b"Sec-WebSocket-Protocol: %s\r\n"
+        b"Sec-WebSocket-Version: 13\r\n"
+        b"\r\n" % (host.encode(), port, key, protocol.encode())
+    )
+    await writer.drain()
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").lower()
+    accept = base64.b64encode(hashlib.sha1(key + _WS_GUID).digest()).decode().lower()
+    if " 101 " not in head.split("\r\n", 1)[0] or accept not in head:
+        writer.close()
+        raise ConnectionError("websocket handshake rejected")
+    return reader, writer
+
+
+def _ws_frame(opcode, payload: bytes):
+    # Client frames must be masked
+    mask = os.urandom(4)
+    n = len(payload)
+    if n < 126:
+        head = struct.pack("!BB", 0x80 | opcode, 0x80 | n)
+    elif n < 65536:
+        head = struct.pack("!BBH", 0x80 | opcode, 0x80 | 126, n)
+    else:
+        head = struct.pack("!BBQ", 0x80 | opcode, 0x80 | 127, n)
+    masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return head + mask + masked
+
+
+async def _ws_send_text(writer, text: str):
+    writer.write(_ws_frame(0x1, text.encode()))
+    await writer.drain()
+
+
+async def _ws_recv(reader, writer) -> str:
+    message = bytearray()
+    while True:
+        b0, b1 = await reader.readexactly(2)
+        opcode = b0 & 0x0F
+        n = b1 & 0x7F
+        if n == 126:
+            (n,) = struct.unpack("!H", await reader.readexactly(2))
+        elif n == 127:
+            (n,) = struct.unpack("!Q", await reader.readexactly(8))
+        mask = await reader.readexactly(4) if b1 & 0x80 else None
+        payload = await reader.readexactly(n)
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+        if opcode == 0x8:
+            writer.write(_ws_frame(0x8, payload[:2]))
+            raise ConnectionError("websocket closed by owntone")
+        if opcode == 0x9:
+            writer.write(_ws_frame(0xA, payload))
+            await writer.drain()
+            continue
+        if opcode == 0xA:
+            continue
+        message += payload
+        if b0 & 0x80:
+            return message.decode("utf-8")
@@ -0,0 +1,140 @@
+import os
+import threading
+from traceback import format_exc
+import album_cache
+import library
+import metrics
+
+# Warm standby for card swaps. Tracks which tag tends to follow which (the
+# TTRPG set swaps between a handful of cards) and, after each tap, pre-stages
+# the most likely next album: its track list is kept resolved in album_cache
+# and the start of its first file is pulled into the page cache, so owntone
+# can start it without waiting on the SD card.
+
+ENABLED = True
+
+## How much of the predicted album's first file to pre-read
+WARM_BYTES = 4 * 1024 * 1024
+
+## Older transitions fade by this factor each time a tag is left again,
+## so the model follows what is being played lately
+DECAY = 0.8
+
+
+class TransitionModel:
+    def __init__(self, decay: float = DECAY):
+        self.decay = decay
+        self.counts = {}  # previous uid -> {next uid: weight}
+
+    def record(self, prev: str, nxt: str):
+        row = self.counts.setdefault(prev, {})
+        for uid in row:
+            row[uid] *= self.decay
+        row[nxt] = row.get(nxt, 0.0) + 1.0
+
+    def predict(self, uid: str):
+        row = self.counts.get(uid)
+        if not row:
+            return None
+        return max(row, key=row.get)
+
+
+def warm_file(path: str, nbytes: int = WARM_BYTES):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, nbytes, os.POSIX_FADV_WILLNEED)
+        else:
+            os.read(fd, nbytes)
+    finally:
+        os.close(fd)
+
+
+predictions = metrics.counter("prefetch_predictions_total", "Taps that matched the pre-staged album", ("result",))
+_hit = predictions.labels("hit")
+_miss = predictions.labels("miss")
+
+
+class Prefetcher:
+    def __init__(self, model: TransitionModel = None):
+        self.model = model or TransitionModel()
+        self.last_uid = None
+        self.predicted = None
+        self.hits = 0
+        self.misses = 0
+        self.warmed = 0
+        self.target = None
+        self.wanted = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        metrics.watch_thread("prefetch", self.thread)
+
+    def on_tap(self, uid: str):
+        if self.predicted is not None:
+            if uid == self.predicted:
+                self.hits += 1
+                _hit.inc()
+            else:
+                self.misses += 1
+                _miss.inc()
+        if self.last_uid is not None and self.last_uid != uid:
+            self.model.record(self.last_uid, uid)
+        self.last_uid = uid
+        self.predicted = self.model.predict(uid)
+        if self.predicted is not None:
+            self.target = self.predicted
+            self.wanted.set()
+
+    def run(self):
+        while True:
+            self.wanted.wait()
+            self.wanted.clear()
+            try:
+                self.warm(self.target)
+            except Exception:
+                print(format_exc())
+
+    def warm(self, uid: str):
+        entry = library.playlists.get(uid)
+        if not entry:
+            return
+        for uri in entry["uris"].split(","):
+            uri = uri.strip()
+            if not uri.startswith(album_cache.ALBUM_PREFIX):
+                continue  # streaming URIs have nothing local to warm
+            album = album_cache.albums.get(uri)
+            if album is None:
+                album_cache.request_refresh()
+                continue
+            if album["paths"]:
+                try:
+                    warm_file(album["paths"][0])
+                    self.warmed += 1
+                except OSError as e:
+                    print(f"[prefetch] could not warm {album['paths'][0]}: {e}")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "warmed": self.warmed,
+            "predicted": self.predicted,
+        }
+
+
+_prefetcher = None
+
+
+def on_tap(uid: str):
+    global _prefetcher
+    if not ENABLED:
+        return
+    if _prefetcher is None:
+        _prefetcher = Prefetcher()
+    _prefetcher.on_tap(uid)
+
+
+def stats():
+    return _prefetcher.stats() if _prefetcher else None
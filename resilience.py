@@ -0,0 +1,126 @@
+import random
+import threading
+from time import monotonic
+
+# Building blocks for talking to a service that may be restarting: a time
+# budget per call, jittered retry delays and a circuit breaker that fails
+# fast instead of letting every caller wait out its own timeout.
+
+## Total seconds one call may take, retries included
+DEADLINE = 4.0
+
+## Extra attempts for calls that are safe to repeat
+RETRIES = 2
+
+## Retry n waits a random 0..RETRY_BASE * 2**n seconds ("full jitter")
+RETRY_BASE = 0.1
+
+## Don't start an attempt with less than this many seconds of the deadline left
+MIN_ATTEMPT = 0.05
+
+## Consecutive failures that open the breaker, and how long it stays open
+## before one trial call is let through
+FAILURE_THRESHOLD = 3
+COOLDOWN = 5.0
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+
+class CircuitOpen(ConnectionError):
+    """Raised instead of making a call while the breaker is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} unavailable (circuit open, next try in {retry_in:.1f}s)")
+        self.retry_in = retry_in
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.expires = monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - monotonic())
+
+    def clamp(self, timeout):
+        """Shrink a timeout (or a (connect, read) pair) to what is left of the budget."""
+        left = self.remaining()
+        if isinstance(timeout, tuple):
+            return tuple(min(t, left) for t in timeout)
+        return min(timeout, left)
+
+
+def retry_delay(attempt: int, deadline: Deadline = None) -> float:
+    delay = random.uniform(0, RETRY_BASE * 2 ** attempt)
+    return min(delay, deadline.remaining()) if deadline else delay
+
+
+class CircuitBreaker:
+    """
+    closed: calls go through; FAILURE_THRESHOLD failures in a row open it.
+    open: calls fail fast with CircuitOpen for COOLDOWN seconds.
+    half-open: one trial call goes through; success closes, failure reopens.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD, cooldown: float = COOLDOWN):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial = False
+        self.listeners = []
+
+    def retry_in(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.cooldown - monotonic())
+
+    def check(self) -> bool:
+        """
+        Raise CircuitOpen unless a call may go ahead now. Returns True if the
+        call is the half-open trial; the caller must then end it with
+        success(), failure() or, if it never got an answer, release().
+        """
+        with self.lock:
+            if self.state == CLOSED:
+                return False
+            if self.state == OPEN and monotonic() - self.opened_at >= self.cooldown:
+                self._set(HALF_OPEN)
+            if self.state == HALF_OPEN and not self.trial:
+                self.trial = True
+                return True
+            raise CircuitOpen(self.name, self.retry_in())
+
+    def release(self):
+        """End a trial call that recorded no outcome (e.g. cancelled), so another may run."""
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.trial = False
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.trial = False
+            if self.state != CLOSED:
+                self._set(CLOSED)
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = monotonic()
+                if self.state != OPEN:
+                    self._set(OPEN)
+
+    def on_change(self, callback):
+        """callback(state) on every transition, under the breaker's lock; keep it short."""
+        self.listeners.append(callback)
+
+    def _set(self, state):
+        self.state = state
+        print(f"[{self.name}] circuit {state}")
+        for callback in self.listeners:
+            callback(state)
@@ -0,0 +1,350 @@
+import asyncio
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from traceback import format_exc
+import media
+import metrics
+import playback
+import resilience
+import player_state
+import volume_control
+from nfc_monitor import NFCMonitor
+from volume_control import VolumeControl, VolumeDispatcher
+from media_async import OwnToneError
+
+# The player process runs on one asyncio event loop. NFC reads, encoder
+# events, playback and owntone notifications are tasks on it. A task that
+# crashes is restarted with back-off. Commands that come in faster than
+# owntone can take them are coalesced (newest wins) rather than queued.
+# Ctrl+C / SIGTERM shuts down cleanly and releases the GPIO pins and SPI bus.
+#
+# Blocking work stays off the loop:
+# - PN532 reads run on one dedicated thread, so SPI access is serialised.
+# - Playback actions (sync owntone calls) run in the default executor.
+# - RPi.GPIO edge callbacks arrive on its own thread and are handed over with
+#   call_soon_threadsafe.
+#
+# Startup brings up the PN532, the encoder and the owntone client in parallel
+# with waiting for owntone. A tap or knob turn during warm-up is held (newest
+# wins) and applied as soon as owntone is ready. The same happens while
+# media.breaker is open, i.e. owntone went away and is being retried. Each phase is logged as
+# "[startup] <seconds since process start> <phase>".
+
+## Delay before restarting a crashed task, doubled per crash up to RESTART_MAX
+RESTART_MIN = 1.0
+RESTART_MAX = 30.0
+
+restarts = metrics.counter("task_restarts_total", "Runtime tasks restarted after a crash", ("task",))
+_volume_requested = volume_control.volume_commands.labels("requested")
+_volume_coalesced = volume_control.volume_commands.labels("coalesced")
+_volume_sent = volume_control.volume_commands.labels("sent")
+_volume_failed = volume_control.volume_commands.labels("failed")
+_playback_superseded = playback.actions_total.labels("superseded")
+
+
+_imported = time.monotonic()
+startup_seconds = metrics.gauge("startup_phase_seconds", "Seconds from process start to each startup phase", ("phase",))
+
+
+def process_uptime() -> float:
+    """Seconds since this process was started (Linux); else since this module was imported."""
+    try:
+        with open("/proc/self/stat") as f:
+            started = int(f.read().rsplit(")", 1)[1].split()[19])  # field 22, starttime
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - started / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.monotonic() - _imported
+
+
+class Timeline:
+    """Logs each startup phase once, as seconds since the process started."""
+
+    def __init__(self):
+        self.offset = process_uptime() - time.monotonic()
+        self.phases = {}
+
+    def mark(self, phase: str):
+        if phase in self.phases:
+            return
+        t = self.phases[phase] = time.monotonic() + self.offset
+        startup_seconds.labels(phase).set(round(t, 3))
+        print(f"[startup] {t:6.2f}s {phase}")
+
+
+class Latest:
+    """One-slot mailbox: put() replaces a value nobody has taken yet."""
+
+    def __init__(self):
+        self.value = None
+        self.ready = asyncio.Event()
+
+    def put(self, value) -> bool:
+        """Returns True if an untaken value was overwritten."""
+        replaced = self.ready.is_set()
+        self.value = value
+        self.ready.set()
+        return replaced
+
+    async def get(self):
+        await self.ready.wait()
+        self.ready.clear()
+        value, self.value = self.value, None
+        return value
+
+
+class PlaybackTask:
+    """
+    playback.worker() under the runtime: same newest-wins contract as
+    playback.PlaybackWorker, with the actions run in the default executor.
+    """
+
+    def __init__(self, loop, ready: asyncio.Event = None, timeline: Timeline = None):
+        self.loop = loop
+        self.ready = ready
+        self.timeline = timeline
+        self.mailbox = Latest()
+        self.generation = 0
+        self.superseded_count = 0
+
+    def submit(self, action, *args):
+        # callable from any thread (NFC reads finish on the reader thread)
+        self.loop.call_soon_threadsafe(self._submit, action, args)
+
+    def _submit(self, action, args):
+        self.generation += 1
+        if self.mailbox.put((self.generation, action, args)):
+            self.superseded_count += 1
+            _playback_superseded.inc()
+
+    async def run(self):
+        while True:
+            if self.ready:
+                await self.ready.wait()  # taps during warm-up wait here
+            generation, action, args = await self.mailbox.get()
+            ok = await asyncio.to_thread(playback.execute, generation, action, args)
+            if not ok and not media.available() and not self.mailbox.ready.is_set():
+                # owntone went away mid-action: hold it until the breaker closes
+                print("holding the last action until owntone is back")
+                self.mailbox.put((generation, action, args))
+            if self.timeline:
+                self.timeline.mark("first playback action done")
+
+
+class VolumeTask:
+    """VolumeDispatcher on the loop: coalesces knob targets, one PUT in flight."""
+
+    def __init__(self, loop, client, on_sent=None, ready: asyncio.Event = None):
+        self.loop = loop
+        self.client = client
+        self.on_sent = on_sent
+        self.ready = ready
+        self.mailbox = Latest()
+        self.retrying = False  # the mailbox holds our own retry, not a new target
+        self.last_sent = None
+
+    def set(self, vol: int):
+        # called from the RPi.GPIO callback thread
+        self.loop.call_soon_threadsafe(self._put, vol)
+
+    def _put(self, vol: int):
+        _volume_requested.inc()
+        self.retrying = False
+        if self.mailbox.put(vol):
+            _volume_coalesced.inc()
+
+    async def run(self):
+        failures = 0
+        while True:
+            if self.ready:
+                await self.ready.wait()
+            vol = await self.mailbox.get()
+            if not self.retrying:
+                failures = 0  # a new target gets its own retries
+            self.retrying = False
+            if vol == self.last_sent:
+                continue
+            try:
+                await self.client.volume(vol)
+            except (OSError, EOFError, asyncio.TimeoutError, OwnToneError, resilience.CircuitOpen) as e:
+                # EOFError: owntone closed the connection mid-response (IncompleteReadError)
+                print(f"[WARN] Could not set volume: {e}")
+                _volume_failed.inc()
+                failures += 1
+                if failures <= VolumeDispatcher.retries:
+                    await asyncio.sleep(VolumeDispatcher.retry_delay)
+                    if not self.mailbox.ready.is_set():
+                        self.mailbox.put(vol)
+                        self.retrying = True
+                continue
+            failures = 0
+            self.last_sent = vol
+            _volume_sent.inc()
+            metrics.heartbeat("volume")
+            if self.on_sent:
+                self.on_sent(vol)
+
+
+class Runtime:
+    def __init__(self, on_card_detected, on_card_removed, on_ready=None, reader=None, encoder: bool = True):
+        self.on_card_detected = on_card_detected
+        self.on_card_removed = on_card_removed
+        self.on_ready = on_ready
+        self.reader = reader
+        self.encoder_enabled = encoder
+
+        self.loop = None
+        self.stopping = None
+        self.owntone_ready = None
+        self.timeline = Timeline()
+        self.tasks = []
+        self.subscriber = player_state.subscriber()
+        self.monitor = None
+        self.volume_control = None
+        self.nfc_executor = ThreadPoolExecutor(1, thread_name_prefix="nfc")
+
+    def spawn(self, name: str, factory):
+        task = self.loop.create_task(self.supervise(name, factory), name=name)
+        metrics.watch_task(name, task)
+        self.tasks.append(task)
+        return task
+
+    async def supervise(self, name: str, factory):
+        delay = RESTART_MIN
+        while True:
+            started = self.loop.time()
+            try:
+                return await factory()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                print(f"[runtime] {name} crashed, restarting in {delay:g}s\n{format_exc()}")
+                restarts.labels(name).inc()
+            if self.loop.time() - started > RESTART_MAX:
+                delay = RESTART_MIN  # it ran fine for a while; not a crash loop
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RESTART_MAX)
+
+    async def wait_ready(self):
+        """Until owntone answers and has finished scanning the library."""
+        state = player_state.state
+        ready = asyncio.Event()
+        state.on_change(lambda events: ready.set() if state.library_ready.is_set() else None)
+        if not state.library_ready.is_set():
+            await ready.wait()
+
+    async def nfc(self):
+        if self.monitor is None:
+            self.monitor = await self.loop.run_in_executor(
+                self.nfc_executor,
+                lambda: NFCMonitor(self.card_detected, self.card_removed, reader=self.reader),
+            )
+        await self.loop.run_in_executor(self.nfc_executor, self.monitor.prepare)
+        self.timeline.mark(f"PN532 ready ({self.monitor.mode})")
+        while True:
+            delay = await self.loop.run_in_executor(self.nfc_executor, self.monitor.step)
+            if delay:
+                await asyncio.sleep(delay)
+
+    async def encoder(self):
+        if self.volume_control is None:
+            self.volume_control = VolumeControl(dispatcher=self.volume_task)
+            self.volume_task.on_sent = self.volume_control.write_volume
+        vc = self.volume_control
+        if vc.mode == "interrupt":
+            try:
+                vc.enable_interrupts()
+            except RuntimeError as e:
+                print(f"[WARN] GPIO edge detection failed ({e}); falling back to polling")
+            else:
+                self.timeline.mark("encoder ready (interrupts)")
+                await self.stopping.wait()
+                return
+        vc.stop_event.clear()
+        self.timeline.mark("encoder ready (polling)")
+        await asyncio.to_thread(vc.start_polling)
+
+    def breaker_changed(self, state: str):
+        # any thread, under the breaker's lock
+        ready = self.owntone_ready
+        try:
+            if state == resilience.OPEN:
+                self.loop.call_soon_threadsafe(ready.clear)
+            elif state == resilience.CLOSED:
+                self.loop.call_soon_threadsafe(ready.set)
+        except RuntimeError:
+            pass  # loop already closed
+
+    def card_detected(self, uid: str):
+        self.timeline.mark("first tap")
+        if not self.owntone_ready.is_set():
+            state = media.breaker.state
+            print(f"card {uid} held until owntone is ready" + ("" if state == resilience.CLOSED else f" (circuit {state})"))
+        self.on_card_detected(uid)
+
+    def card_removed(self):
+        self.on_card_removed()
+
+    async def run(self):
+        self.timeline.mark("imports done")
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        self.owntone_ready = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            self.loop.add_signal_handler(sig, self.stopping.set)
+
+        self.playback_task = PlaybackTask(self.loop, ready=self.owntone_ready, timeline=self.timeline)
+        playback.use_worker(self.playback_task)
+        self.volume_task = VolumeTask(self.loop, self.subscriber.client, ready=self.owntone_ready)
+
+        # hardware comes up while we wait for owntone
+        self.spawn("nfc", self.nfc)
+        if self.encoder_enabled:
+            self.spawn("encoder", self.encoder)
+        self.spawn("state", self.subscriber.run)
+        self.spawn("playback", self.playback_task.run)
+        self.spawn("volume", self.volume_task.run)
+        self.tasks.append(self.loop.create_task(self.startup()))
+
+        await self.stopping.wait()
+        await self.shutdown()
+
+    async def startup(self):
+        print("waiting for media server")
+        # the sync client (and requests) is needed by the first tap; load it meanwhile
+        client = asyncio.to_thread(media.shared)
+        await asyncio.gather(client, self.wait_ready())
+        self.timeline.mark("owntone ready")
+        self.owntone_ready.set()
+        media.breaker.on_change(self.breaker_changed)
+        print("media server ready")
+        if self.on_ready:
+            await asyncio.to_thread(self.on_ready)
+        self.timeline.mark("library watch and album cache started")
+
+    async def shutdown(self):
+        print("shutting down")
+        if self.volume_control:
+            self.volume_control.stop()  # ends the polling loop, if that is what runs
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+        # let an in-flight PN532 read finish before the bus goes away
+        await asyncio.to_thread(self.nfc_executor.shutdown)
+        if self.monitor:
+            self.monitor.close()
+        if self.volume_control:
+            self.volume_control.close()
+        await self.subscriber.client.close()
+        print("stopped")
+
+    def stop(self):
+        """Thread-safe request to shut down."""
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.stopping.set)
+
+
+def run(on_card_detected, on_card_removed, **kwargs):
+    asyncio.run(Runtime(on_card_detected, on_card_removed, **kwargs).run())
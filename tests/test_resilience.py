@@ -0,0 +1,169 @@
+import asyncio
+
+import pytest
+import requests
+
+import media
+import media_async
+import resilience
+import runtime
+from resilience import CircuitBreaker, CircuitOpen
+
+
+def half_open(breaker):
+    breaker.failure()
+    assert breaker.state == resilience.OPEN
+    return breaker
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    b = CircuitBreaker("test", failure_threshold=1, cooldown=0)
+    monkeypatch.setattr(media, "breaker", b)
+    return b
+
+
+def test_release_lets_the_next_trial_through(breaker):
+    half_open(breaker)
+    assert breaker.check() is True  # the trial
+    with pytest.raises(CircuitOpen):
+        breaker.check()
+    breaker.release()
+    assert breaker.check() is True
+
+
+def test_cancelled_async_trial_is_released(breaker):
+    async def scenario():
+        # a server that accepts and never answers
+        server = await asyncio.start_server(lambda r, w: asyncio.sleep(10), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        client = media_async.AsyncOwnToneClient(f"http://127.0.0.1:{port}", timeout=5)
+        half_open(breaker)
+        call = asyncio.create_task(client.player())
+        await asyncio.sleep(0.1)
+        assert breaker.trial
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        server.close()
+        await client.close()
+
+    asyncio.run(scenario())
+    assert breaker.state == resilience.HALF_OPEN
+    assert breaker.check() is True
+
+
+def test_incomplete_read_counts_as_failure(breaker):
+    async def scenario():
+        async def hang_up(reader, writer):
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\n{")
+            writer.close()
+
+        server = await asyncio.start_server(hang_up, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        client = media_async.AsyncOwnToneClient(f"http://127.0.0.1:{port}", timeout=5)
+        half_open(breaker)
+        with pytest.raises(asyncio.IncompleteReadError):
+            await client.player()
+        server.close()
+        await client.close()
+
+    asyncio.run(scenario())
+    assert breaker.state == resilience.OPEN
+    assert not breaker.trial
+
+
+def test_unexpected_sync_error_releases_trial(breaker):
+    client = media.OwnToneClient("http://127.0.0.1:9", breaker=breaker)
+
+    def bad_header(*args, **kwargs):
+        raise requests.exceptions.InvalidHeader("bad header")
+
+    client.session.request = bad_header
+    half_open(breaker)
+    with pytest.raises(requests.exceptions.InvalidHeader):
+        client.player()
+    assert breaker.check() is True
+
+
+def test_no_attempt_after_the_deadline_is_spent(monkeypatch):
+    breaker = CircuitBreaker("test", failure_threshold=10)
+    client = media.OwnToneClient("http://127.0.0.1:9", breaker=breaker, deadline=0.2, retries=5)
+    timeouts = []
+
+    def refused(method, url, timeout=None, **kwargs):
+        timeouts.append(timeout)
+        raise requests.exceptions.ConnectTimeout("refused")
+
+    client.session.request = refused
+    # the jitter happens to use up everything that is left
+    monkeypatch.setattr(resilience, "retry_delay", lambda attempt, deadline: deadline.remaining())
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        client.player()
+    assert len(timeouts) == 1
+    assert min(timeouts[0]) > 0
+
+
+def test_volume_task_keeps_target_after_incomplete_read(monkeypatch):
+    monkeypatch.setattr(runtime.VolumeDispatcher, "retry_delay", 0)
+
+    class Flaky:
+        def __init__(self):
+            self.calls = []
+
+        async def volume(self, vol):
+            self.calls.append(vol)
+            if len(self.calls) == 1:
+                raise asyncio.IncompleteReadError(b"", 10)
+            if len(self.calls) == 2:
+                raise CircuitOpen("owntone", 1.0)
+
+    async def scenario():
+        client = Flaky()
+        task = runtime.VolumeTask(asyncio.get_running_loop(), client)
+        runner = asyncio.create_task(task.run())
+        task.set(40)
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if task.last_sent == 40:
+                break
+        assert not runner.done()
+        runner.cancel()
+        return client.calls, task.last_sent
+
+    calls, last_sent = asyncio.run(scenario())
+    assert calls == [40, 40, 40]
+    assert last_sent == 40
+
+
+def test_subscriber_probes_when_the_breaker_half_opens(monkeypatch):
+    import player_state
+
+    breaker = CircuitBreaker("test", failure_threshold=1, cooldown=0.3)
+    monkeypatch.setattr(media, "breaker", breaker)
+    attempts = []
+
+    class Client:
+        host = "127.0.0.1"
+
+        async def player(self):
+            attempts.append(breaker.state)
+            breaker.check()
+            if len(attempts) < 6:
+                breaker.failure()  # owntone still restarting
+                raise ConnectionRefusedError()
+            breaker.success()  # owntone is back
+            raise asyncio.CancelledError  # stop the subscriber here
+
+    async def scenario():
+        subscriber = player_state.StateSubscriber(player_state.PlayerState(), Client())
+        started = asyncio.get_running_loop().time()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(subscriber.run(), 10)
+        return asyncio.get_running_loop().time() - started
+
+    elapsed = asyncio.run(scenario())
+    # with plain doubling (0.5 + 1 + 2 + 4 + 8) the sixth attempt would come after 15.5s
+    assert elapsed < 3
+    assert breaker.state == resilience.CLOSED
@@ -0,0 +1,107 @@
+import sys
+import types
+
+import pytest
+
+import volume_control
+from volume_control import CLK_PIN, DT_PIN, SW_PIN, QuadratureDecoder, VolumeControl
+
+# (CLK, DT) levels; the encoder rests at (1, 1) between detents
+CW = [(0, 1), (0, 0), (1, 0), (1, 1)]
+CCW = [(1, 0), (0, 0), (0, 1), (1, 1)]
+# contact chatter that never completes a detent
+BOUNCE = [(0, 1), (1, 1), (0, 1), (1, 1), (1, 0), (1, 1), (1, 0), (0, 0), (1, 0), (1, 1)]
+# chatter on one contact in the middle of a real clockwise detent
+BOUNCY_CW = [(0, 1), (0, 0), (0, 1), (0, 0), (1, 0), (0, 0), (1, 0), (1, 1)]
+
+
+class FakeGPIO(types.ModuleType):
+    BCM = IN = PUD_UP = BOTH = FALLING = 0
+
+    def __init__(self):
+        super().__init__("RPi.GPIO")
+        self.levels = {CLK_PIN: 1, DT_PIN: 1, SW_PIN: 1}
+        self.on_poll = None
+
+    def setmode(self, mode): pass
+    def setwarnings(self, flag): pass
+    def setup(self, pin, direction, pull_up_down=None): pass
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None): pass
+    def remove_event_detect(self, pin): pass
+    def cleanup(self, pins=None): pass
+
+    def input(self, pin):
+        if pin == SW_PIN and self.on_poll:
+            self.on_poll()  # the polling loop reads SW last in each pass
+        return self.levels[pin]
+
+
+class Dispatcher:
+    def __init__(self):
+        self.targets = []
+
+    def set(self, vol):
+        self.targets.append(vol)
+
+
+@pytest.fixture
+def control(monkeypatch, tmp_path):
+    gpio = FakeGPIO()
+    rpi = types.ModuleType("RPi")
+    rpi.GPIO = gpio
+    monkeypatch.setitem(sys.modules, "RPi", rpi)
+    monkeypatch.setitem(sys.modules, "RPi.GPIO", gpio)
+    monkeypatch.setattr(volume_control, "VOLUME_FILE", str(tmp_path / "volume"))
+    monkeypatch.setattr(volume_control, "volume", 50)
+    monkeypatch.setattr(volume_control, "muted_volume", None)
+    monkeypatch.setattr(volume_control, "poll_interval", 0)
+    vc = VolumeControl(mode="polling", dispatcher=Dispatcher())
+    return vc, gpio
+
+
+def detents(vc):
+    return (volume_control.volume - 50) // volume_control.volume_step
+
+
+def run_polling(vc, gpio, levels):
+    pending = list(levels)
+
+    def next_level():
+        if pending:
+            gpio.levels[CLK_PIN], gpio.levels[DT_PIN] = pending.pop(0)
+        else:
+            vc.stop()
+
+    gpio.on_poll = next_level
+    vc.start_polling()
+
+
+def run_edges(vc, gpio, levels):
+    for clk, dt in levels:
+        changed = CLK_PIN if clk != gpio.levels[CLK_PIN] else DT_PIN
+        gpio.levels[CLK_PIN], gpio.levels[DT_PIN] = clk, dt
+        vc._encoder_edge(changed)
+
+
+@pytest.mark.parametrize("feed", [run_polling, run_edges], ids=["polling", "interrupt"])
+@pytest.mark.parametrize("levels, net, steps", [
+    (CW, 1, 1),
+    (CCW, -1, 1),
+    (CW * 3, 3, 3),
+    (CCW * 2, -2, 2),
+    (CW * 3 + CCW, 2, 4),
+    (BOUNCE, 0, 0),
+    (BOUNCE + CW + BOUNCE, 1, 1),
+    (BOUNCY_CW, 1, 1),
+    (BOUNCY_CW + CCW + BOUNCE, 0, 2),
+], ids=["cw", "ccw", "cw-x3", "ccw-x2", "mixed", "bounce", "bounce-around-cw", "bouncy-cw", "bouncy-then-back"])
+def test_net_detents(control, feed, levels, net, steps):
+    vc, gpio = control
+    feed(vc, gpio, levels)
+    assert detents(vc) == net
+    assert len(vc.dispatcher.targets) == steps  # one volume target per detent, none for bounce
+
+
+def test_bounce_alone_never_steps():
+    decoder = QuadratureDecoder()
+    assert [decoder.update(clk, dt) for clk, dt in BOUNCE] == [0] * len(BOUNCE)
@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+import pytest
+
+import runtime
+from volume_control import VolumeDispatcher
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(VolumeDispatcher, "retry_delay", 0.01)
+
+
+def test_new_target_after_failures_gets_all_its_retries():
+    attempts = []
+
+    def send(vol):
+        attempts.append(vol)
+        if attempts.count(10) == 2 and vol == 10:
+            dispatcher.set(20)  # the knob moves on while 10 is failing
+        raise OSError("owntone unreachable")
+
+    dispatcher = VolumeDispatcher(send)
+    dispatcher.set(10)
+    time.sleep(0.5)
+    assert attempts.count(10) == 2
+    assert attempts.count(20) == 1 + VolumeDispatcher.retries
+
+
+def test_volume_task_new_target_after_failures_gets_all_its_retries():
+    attempts = []
+    tasks = []
+
+    class Down:
+        async def volume(self, vol):
+            attempts.append(vol)
+            if attempts.count(10) == 2 and vol == 10:
+                tasks[0].set(20)
+            raise OSError("owntone unreachable")
+
+    async def scenario():
+        task = runtime.VolumeTask(asyncio.get_running_loop(), Down())
+        tasks.append(task)
+        runner = asyncio.create_task(task.run())
+        task.set(10)
+        await asyncio.sleep(0.5)
+        runner.cancel()
+
+    asyncio.run(scenario())
+    assert attempts.count(10) == 2
+    assert attempts.count(20) == 1 + VolumeDispatcher.retries
@@ -1,14 +1,19 @@
 #!/usr/bin/env python3
 """
 Volume Control for NFC Music Player
-Polling-based version for rotary encoder and button
+Interrupt-driven (or polling fallback) rotary encoder and button
 """
-import RPi.GPIO as GPIO
 import time
 import sys
 import signal
 import subprocess
+import threading
 import media
+import metrics
+
+# RPi.GPIO is imported when the encoder is set up, so the dispatcher and
+# decoder can be used off-Pi (e.g. by benchmarks/latency.py)
+GPIO = None
 
 # Volume control file
 VOLUME_FILE = '/tmp/music_volume'
@@ -30,12 +35,124 @@ DT_PIN  = 27  # Pin 13 - Data
 SW_PIN  = 22  # Pin 15 - Switch/Button (to GND, PUD_UP)
 
 # Debounce settings
-debounce_delay = 0.01  # 10ms for rotary
 button_delay = 0.3     # 300ms for button
 
+# "interrupt" uses GPIO edge detection; "polling" is the 1ms busy-poll fallback
+ENCODER_MODE = "interrupt"
+poll_interval = 0.001
+
 # Mute state
 muted_volume = None
 
+# Full-step quadrature state machine (after Ben Buxton's rotary decoder).
+# Input is (CLK << 1) | DT; a step is only reported once the encoder has
+# walked through a complete, valid gray-code cycle back to rest, so contact
+# bounce and missed intermediate edges never produce spurious steps.
+_R_START, _R_CW_FINAL, _R_CW_BEGIN, _R_CW_NEXT, _R_CCW_BEGIN, _R_CCW_FINAL, _R_CCW_NEXT = range(7)
+_DIR_CW = 0x10
+_DIR_CCW = 0x20
+_TRANSITIONS = (
+    (_R_START,     _R_CW_BEGIN,  _R_CCW_BEGIN, _R_START),
+    (_R_CW_NEXT,   _R_START,     _R_CW_FINAL,  _R_START | _DIR_CW),
+    (_R_CW_NEXT,   _R_CW_BEGIN,  _R_START,     _R_START),
+    (_R_CW_NEXT,   _R_CW_BEGIN,  _R_CW_FINAL,  _R_START),
+    (_R_CCW_NEXT,  _R_START,     _R_CCW_BEGIN, _R_START),
+    (_R_CCW_NEXT,  _R_CCW_FINAL, _R_START,     _R_START | _DIR_CCW),
+    (_R_CCW_NEXT,  _R_CCW_FINAL, _R_CCW_BEGIN, _R_START),
+)
+
+
+class QuadratureDecoder:
+    """Feed it pin levels; returns +1 (clockwise), -1 (counter-clockwise) or 0."""
+
+    def __init__(self):
+        self.state = _R_START
+
+    def update(self, clk: int, dt: int) -> int:
+        self.state = _TRANSITIONS[self.state & 0x0F][(clk << 1) | dt]
+        if self.state & _DIR_CW:
+            return 1
+        if self.state & _DIR_CCW:
+            return -1
+        return 0
+
+
+volume_commands = metrics.counter("volume_commands_total", "Volume targets from the knob and what became of them", ("result",))
+_requested = volume_commands.labels("requested")
+_sent = volume_commands.labels("sent")
+_coalesced = volume_commands.labels("coalesced")
+_failed = volume_commands.labels("failed")
+
+
+class VolumeDispatcher:
+    """
+    Coalesces volume commands: only the latest target is kept and at most one
+    request is in flight, so a fast spin converges on the final value instead
+    of queueing a PUT per detent.
+    """
+
+    retries = 3
+    retry_delay = 0.5
+
+    def __init__(self, send):
+        self.send = send
+        self.cond = threading.Condition()
+        self.target = None
+        self.retrying = False  # target is our own retry, not a new one from set()
+        self.last_sent = None
+        self.requested = 0
+        self.sent = 0
+        self.dropped = 0  # targets superseded before they were sent
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        metrics.watch_thread("volume", self.thread)
+
+    def set(self, vol: int):
+        with self.cond:
+            self.requested += 1
+            _requested.inc()
+            if self.target is not None:
+                self.dropped += 1
+                _coalesced.inc()
+            self.target = vol
+            self.retrying = False
+            self.cond.notify()
+
+    def run(self):
+        failures = 0
+        while True:
+            with self.cond:
+                while self.target is None:
+                    self.cond.wait()
+                vol, self.target = self.target, None
+                if not self.retrying:
+                    failures = 0  # a new target gets its own retries
+                self.retrying = False
+            if vol == self.last_sent:
+                continue
+            try:
+                self.send(vol)
+            except Exception as e:
+                print(f"[WARN] Could not set volume: {e}")
+                _failed.inc()
+                failures += 1
+                with self.cond:
+                    # retry the final value unless something newer came in meanwhile
+                    if self.target is None and failures <= self.retries:
+                        self.target = vol
+                        self.retrying = True
+                        self.cond.wait(self.retry_delay)
+                continue
+            failures = 0
+            self.last_sent = vol
+            self.sent += 1
+            _sent.inc()
+            metrics.heartbeat("volume")
+
+    def stats(self):
+        return {"requested": self.requested, "sent": self.sent, "dropped": self.dropped}
+
+
 class VolumeControl:
     last_clk = None
     last_sw = None
@@ -44,14 +161,17 @@ class VolumeControl:
 
     def apply_system_volume(self, vol: int):
         vol = max(0, min(100, int(vol)))
-        try:
-            # -q = quiet; -M = use mapped dB scale; -D default = use default device
-            media.volume(vol)
-        except Exception as e:
-            print(f"[WARN] Could not set volume: {e}")
+        self.dispatcher.set(vol)
+    
+    def send_volume(self, vol: int):
+        # Runs on the dispatcher thread, once per coalesced target
+        media.volume(vol)
+        self.write_volume(vol)
     
     
     def setup_gpio(self):
+        global GPIO
+        import RPi.GPIO as GPIO
         GPIO.setmode(GPIO.BCM)
         GPIO.setwarnings(False)
         GPIO.setup(CLK_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
@@ -60,10 +180,10 @@ class VolumeControl:
         
         print(f"Volume control initialized on GPIO pins CLK={CLK_PIN}, DT={DT_PIN}, SW={SW_PIN}")
     
-    def write_volume(self):
+    def write_volume(self, vol: int = None):
         try:
             with open(VOLUME_FILE, 'w') as f:
-                f.write(str(volume))
+                f.write(str(volume if vol is None else vol))
         except Exception as e:
             print(f"Error writing volume: {e}")
     
@@ -82,13 +202,12 @@ class VolumeControl:
         if muted_volume is not None:
             volume = muted_volume
             muted_volume = None
-            apply_system_volume(volume)
+            self.apply_system_volume(volume)
             print(f"🔊 Unmuted - Volume: {volume}%")
         
         new_volume = max(min_volume, min(max_volume, volume + delta))
         if new_volume != volume:
             volume = new_volume
-            self.write_volume()
             direction = "🔊" if delta > 0 else "🔉"
             self.apply_system_volume(volume)
             print(f"{direction} Volume: {volume}%")
@@ -101,7 +220,6 @@ class VolumeControl:
             if volume > 0:
                 muted_volume = volume
                 volume = 0
-                self.write_volume()
                 self.apply_system_volume(volume)
                 print("🔇 Muted")
             else:
@@ -110,13 +228,15 @@ class VolumeControl:
             # Currently muted - unmute it
             volume = muted_volume
             muted_volume = None
-            self.write_volume()
             self.apply_system_volume(volume)
             print(f"🔊 Unmuted - Volume: {volume}%")
     
-    def __init__(self):
-        signal.signal(signal.SIGINT, cleanup)
-        signal.signal(signal.SIGTERM, cleanup)
+    def __init__(self, mode: str = None, dispatcher=None):
+        self.mode = mode or ENCODER_MODE
+        self.decoder = QuadratureDecoder()
+        self.stop_event = threading.Event()
+        # anything with set(vol); the runtime passes one that feeds its volume task
+        self.dispatcher = dispatcher or VolumeDispatcher(self.send_volume)
         
         self.setup_gpio()
         self.read_volume()
@@ -128,39 +248,85 @@ class VolumeControl:
         self.last_rot_time = time.time()
         self.last_btn_time = time.time()
     
+    def on_encoder(self, clk: int, dt: int):
+        step = self.decoder.update(clk, dt)
+        if step:
+            self.change_volume(step * volume_step)
+    
+    def on_button(self, now: float):
+        if now - self.last_btn_time > button_delay:
+            self.toggle_mute()
+            self.last_btn_time = now
+    
+    def _encoder_edge(self, channel):
+        # RPi.GPIO runs all edge callbacks on one thread, so the decoder
+        # never sees two edges at once
+        self.on_encoder(GPIO.input(CLK_PIN), GPIO.input(DT_PIN))
+    
+    def _button_edge(self, channel):
+        if GPIO.input(SW_PIN) == 0:
+            self.on_button(time.time())
+    
+    def enable_interrupts(self):
+        try:
+            GPIO.add_event_detect(CLK_PIN, GPIO.BOTH, callback=self._encoder_edge)
+            GPIO.add_event_detect(DT_PIN, GPIO.BOTH, callback=self._encoder_edge)
+            GPIO.add_event_detect(SW_PIN, GPIO.FALLING, callback=self._button_edge,
+                                  bouncetime=int(button_delay * 1000))
+        except RuntimeError:
+            for pin in (CLK_PIN, DT_PIN, SW_PIN):
+                GPIO.remove_event_detect(pin)
+            raise
+
+    def start_interrupts(self):
+        self.enable_interrupts()
+        self.stop_event.wait()
+    
+    def start_polling(self):
+        while not self.stop_event.is_set():
+            # --- Rotary encoder handling ---
+            self.on_encoder(GPIO.input(CLK_PIN), GPIO.input(DT_PIN))
+            
+            # --- Button handling ---
+            sw = GPIO.input(SW_PIN)
+            if sw == 0 and self.last_sw == 1:
+                self.on_button(time.time())
+            self.last_sw = sw
+            
+            time.sleep(poll_interval)
+    
     def start(self):
+        signal.signal(signal.SIGINT, cleanup)
+        signal.signal(signal.SIGTERM, cleanup)
         print("Volume Control for NFC Music Player")
         print("Rotate encoder to change volume, press button to mute/unmute")
         print("Ctrl+C to exit")
         try:
-            while True:
-                now = time.time()
-                
-                # --- Rotary encoder handling ---
-                clk = GPIO.input(CLK_PIN)
-                if clk != self.last_clk and now - self.last_rot_time > debounce_delay:
-                    dt = GPIO.input(DT_PIN)
-                    if clk == 0:  # falling edge on CLK
-                        if dt != clk:
-                            self.change_volume(volume_step)   # clockwise
-                        else:
-                            self.change_volume(-volume_step)  # counter-clockwise
-                    last_rot_time = now
-                self.last_clk = clk
-                
-                # --- Button handling (polling only) ---
-                sw = GPIO.input(SW_PIN)
-                if sw == 0 and self.last_sw == 1 and now - self.last_btn_time > button_delay:
-                    self.toggle_mute()
-                    self.last_btn_time = now
-                self.last_sw = sw
-                
-                time.sleep(0.001)  # 1ms polling
+            if self.mode == "interrupt":
+                try:
+                    self.start_interrupts()
+                    return
+                except RuntimeError as e:
+                    # e.g. edge detection unavailable on this kernel/driver
+                    print(f"[WARN] GPIO edge detection failed ({e}); falling back to polling")
+            self.start_polling()
                 
         except KeyboardInterrupt:
             cleanup()
     
+    def stop(self):
+        self.stop_event.set()
+
+    def close(self):
+        """Stop and release the encoder pins (the rest of GPIO is left alone)."""
+        self.stop()
+        if GPIO is not None:
+            for pin in (CLK_PIN, DT_PIN, SW_PIN):
+                GPIO.remove_event_detect(pin)
+            GPIO.cleanup((CLK_PIN, DT_PIN, SW_PIN))
+
 def cleanup(signum=None, frame=None):
     print("\nCleaning up GPIO...")
-    GPIO.cleanup()
+    if GPIO is not None:
+        GPIO.cleanup()
     sys.exit(0)
\ No newline at end of file
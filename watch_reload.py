@@ -33,3 +33,31 @@ def start_watch(module_name, file_path, on_reload=None):
     obs.schedule(handler, os.path.dirname(file_path) or ".", recursive=False)
     obs.start()
     return obs, handler
+
+class CallOnChange(FileSystemEventHandler):
+    """Calls on_change(path) when a single (data) file is written or replaced."""
+    def __init__(self, file_path, on_change):
+        self.file_path = os.path.abspath(file_path)
+        self.on_change = on_change
+
+    def _check(self, path):
+        if os.path.abspath(path) == self.file_path:
+            self.on_change(self.file_path)
+
+    def on_modified(self, event):
+        self._check(event.src_path)
+
+    def on_created(self, event):
+        self._check(event.src_path)
+
+    def on_moved(self, event):
+        # editors often save by writing a temp file and renaming it over the original
+        self._check(event.dest_path)
+
+def start_watch_file(file_path, on_change):
+    handler = CallOnChange(file_path, on_change)
+    obs = Observer()
+    obs.schedule(handler, os.path.dirname(os.path.abspath(file_path)), recursive=False)
+    obs.daemon = True
+    obs.start()
+    return obs, handler